@@ -45,3 +45,18 @@ def few_posts_with_group(mixer, user, group):
 def another_few_posts_with_group_with_follower(mixer, user, another_user, group):
     mixer.blend('posts.Follow', user=user, author=another_user)
     mixer.cycle(20).blend(Post, author=another_user, group=group)
+
+
+@pytest.fixture
+def seeded_data(mixer, user, another_user, group):
+    """Набор данных, на котором страницы должны укладываться в бюджет."""
+    from posts.models import Comment, Follow, ProfileStats
+    mixer.blend(Follow, user=user, author=another_user)
+    mixer.cycle(15).blend(Post, author=user, group=group, image='')
+    posts = mixer.cycle(15).blend(Post, author=another_user, group=group, image='')
+    mixer.cycle(30).blend(Comment, post=posts[0], author=user)
+    # Счётчики уже заведены: бюджет считается для обычного пути, а не
+    # для первого обращения к профилю.
+    ProfileStats.for_user(user)
+    ProfileStats.for_user(another_user)
+    return posts[0]
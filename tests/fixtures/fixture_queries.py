@@ -0,0 +1,22 @@
+from contextlib import contextmanager
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from tests.utils import assert_query_budget
+
+
+@pytest.fixture
+def query_budget():
+    """Контекст, проверяющий число и время SQL-запросов внутри блока."""
+    @contextmanager
+    def check(label, max_queries, max_time):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        assert_query_budget(
+            context.captured_queries, label, max_queries, max_time
+        )
+    return check
@@ -0,0 +1,80 @@
+import pytest
+from django.urls import reverse
+
+from about.urls import urlpatterns as about_urls
+from api.urls import urlpatterns as api_urls
+from posts.urls import urlpatterns as posts_urls
+from users.urls import urlpatterns as users_urls
+
+pytestmark = [pytest.mark.django_db]
+
+# Бюджет запросов для каждого именованного маршрута:
+# (namespace:name, аргументы URL, нужна ли авторизация, максимум запросов,
+# максимум суммарного времени запросов в секундах).
+# Значения не должны зависеть от объёма данных в seeded_data.
+ROUTE_BUDGETS = {
+    'posts:main_posts': (lambda post: {}, False, 1, 0.1),
+    'posts:group_list': (lambda post: {'slug': post.group.slug}, False, 3, 0.1),
+    'posts:group_export': (lambda post: {'slug': post.group.slug}, True, 5, 0.2),
+    'posts:profile': (lambda post: {'username': post.author.username}, False, 4, 0.1),
+    'posts:profile_export': (lambda post: {'username': post.author.username}, True, 5, 0.2),
+    'posts:post_detail': (lambda post: {'post_id': post.id}, False, 5, 0.2),
+    'posts:create_post': (lambda post: {}, True, 3, 0.1),
+    'posts:edit': (lambda post: {'post_id': post.id}, True, 4, 0.1),
+    'posts:add_comment': (lambda post: {'post_id': post.id}, True, 3, 0.1),
+    'posts:comments': (lambda post: {'post_id': post.id}, False, 3, 0.1),
+    'posts:search': (lambda post: {}, False, 2, 0.1),
+    'posts:follow_index': (lambda post: {}, True, 3, 0.1),
+    'posts:profile_follow': (lambda post: {'username': post.author.username}, True, 4, 0.1),
+    'posts:profile_unfollow': (lambda post: {'username': post.author.username}, True, 7, 0.2),
+    'users:logout': (lambda post: {}, True, 4, 0.1),
+    'users:signup': (lambda post: {}, False, 0, 0),
+    'users:login': (lambda post: {}, False, 0, 0),
+    'users:password_change': (lambda post: {}, True, 2, 0.1),
+    'users:password_change_done': (lambda post: {}, True, 2, 0.1),
+    'about:author': (lambda post: {}, False, 0, 0),
+    'about:tech': (lambda post: {}, False, 0, 0),
+    'api:index': (lambda post: {}, False, 1, 0.1),
+    'api:post_detail': (lambda post: {'post_id': post.id}, False, 2, 0.1),
+    'api:group_list': (lambda post: {'slug': post.group.slug}, False, 3, 0.1),
+    'api:profile': (lambda post: {'username': post.author.username}, False, 4, 0.1),
+    'api:follow_index': (lambda post: {}, True, 3, 0.1),
+}
+# GET-параметры для маршрутов, которым без них нечего показывать.
+ROUTE_PARAMS = {
+    'posts:group_export': lambda post: {'comments': '1'},
+    'posts:profile_export': lambda post: {'comments': '1'},
+    'posts:search': lambda post: {'q': post.text.split()[0]},
+}
+
+
+def test_every_route_has_budget():
+    routes = {
+        f'{namespace}:{pattern.name}'
+        for namespace, patterns in (
+            ('posts', posts_urls), ('users', users_urls), ('about', about_urls),
+            ('api', api_urls),
+        )
+        for pattern in patterns
+    }
+    missing = routes - set(ROUTE_BUDGETS)
+    assert not missing, (
+        f'Объявите бюджет запросов в `ROUTE_BUDGETS` для маршрутов: {sorted(missing)}'
+    )
+
+
+@pytest.mark.parametrize('route', sorted(ROUTE_BUDGETS))
+def test_route_query_budget(route, client, user, seeded_data, query_budget):
+    url_kwargs, login_required, max_queries, max_time = ROUTE_BUDGETS[route]
+    if login_required:
+        client.force_login(user)
+    url = reverse(route, kwargs=url_kwargs(seeded_data))
+    params = ROUTE_PARAMS.get(route, lambda post: {})(seeded_data)
+    with query_budget(route, max_queries, max_time):
+        response = client.get(url, params)
+        if response.streaming:
+            # Выгрузки читают базу, пока отдаётся тело ответа.
+            b''.join(response.streaming_content)
+    assert response.status_code < 400, (
+        f'Страница `{url}` вернула {response.status_code}'
+    )
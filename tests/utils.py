@@ -3,3 +3,19 @@ def get_field_from_context(context, field_type):
         if field not in ('user', 'request') and isinstance(context[field], field_type):
             return context[field]
     return
+
+
+def assert_query_budget(queries, label, max_queries, max_time):
+    """Проверяет число и суммарное время SQL-запросов, выводя их список."""
+    total_time = sum(float(query['time']) for query in queries)
+    if len(queries) <= max_queries and total_time <= max_time:
+        return
+    listing = '\n'.join(
+        f'{number}. [{query["time"]}s] {query["sql"]}'
+        for number, query in enumerate(queries, start=1)
+    )
+    assert False, (
+        f'`{label}` превышает бюджет: {len(queries)} запросов '
+        f'(допустимо {max_queries}), {total_time:.3f}s '
+        f'(допустимо {max_time}s):\n{listing}'
+    )
@@ -0,0 +1,66 @@
+from django.core.files.storage import default_storage
+
+# Поле ответа -> путь для values(). Связанные поля берутся join'ом,
+# объекты моделей не создаются.
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+# Нужны всегда: из них строятся теги кэша страницы.
+TAG_FIELDS = ('id', 'author_id', 'group__slug')
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def parse_fields(value, available=POST_FIELDS):
+    """Список полей из ?fields=a,b; без параметра — все поля."""
+    if not value:
+        return list(available)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise FieldsError(
+            f'Неизвестные поля: {", ".join(unknown)}. '
+            f'Доступны: {", ".join(available)}.'
+        )
+    return fields
+
+
+def post_values(queryset, fields, prefix='', ordering=()):
+    """values() по постам: нужные поля, поля тегов и сортировки.
+
+    prefix — путь от модели queryset к посту (например, 'post__'
+    для записей ленты).
+    """
+    lookups = {
+        prefix + path
+        for path in [POST_FIELDS[name] for name in fields] + list(TAG_FIELDS)
+    }
+    lookups.update(field.lstrip('-') for field in ordering)
+    return queryset.values(*lookups)
+
+
+def serialize_post(row, fields, prefix=''):
+    data = {name: row[prefix + POST_FIELDS[name]] for name in fields}
+    if data.get('image'):
+        data['image'] = default_storage.url(data['image'])
+    elif 'image' in data:
+        data['image'] = None
+    return data
+
+
+def row_tags(rows, prefix=''):
+    """Теги кэша для страницы с этими строками (как core.cache.post_tags)."""
+    tags = set()
+    for row in rows:
+        tags.add(f'post:{row[prefix + "id"]}')
+        tags.add(f'author:{row[prefix + "author_id"]}')
+        if row[prefix + 'group__slug']:
+            tags.add(f'group:{row[prefix + "group__slug"]}')
+    return tags
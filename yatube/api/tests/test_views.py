@@ -0,0 +1,127 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post
+from posts.paginators import POST_IN_PAGE
+
+User = get_user_model()
+
+INDEX = reverse('api:index')
+FOLLOW = reverse('api:follow_index')
+
+
+class ApiViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='api_author')
+        cls.reader = User.objects.create_user(username='api_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='api_group', description='Описание'
+        )
+        for number in range(POST_IN_PAGE + 3):
+            Post.objects.create(
+                text=f'Пост {number}', author=cls.author, group=cls.group
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def collect(self, url, **params):
+        """Все страницы ответа по курсору next."""
+        results = []
+        while True:
+            data = self.client.get(url, params).json()
+            results += data['results']
+            if not data['next']:
+                return results
+            params['after'] = data['next']
+
+    def test_index_pages_cover_feed(self):
+        expected = list(Post.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+        ids = [post['id'] for post in self.collect(INDEX)]
+        self.assertEqual(ids, expected)
+
+    def test_post_fields(self):
+        post = Post.objects.latest('id')
+        data = self.client.get(
+            reverse('api:post_detail', kwargs={'post_id': post.id})
+        ).json()
+        self.assertEqual(data['text'], post.text)
+        self.assertEqual(data['author'], self.author.username)
+        self.assertEqual(data['group'], self.group.slug)
+        self.assertIsNone(data['image'])
+
+    def test_sparse_fields(self):
+        """?fields= оставляет в ответе только перечисленные поля."""
+        data = self.client.get(INDEX, {'fields': 'id,author'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'author'})
+
+    def test_unknown_field(self):
+        response = self.client.get(INDEX, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_group_and_profile(self):
+        group = self.client.get(
+            reverse('api:group_list', kwargs={'slug': self.group.slug})
+        ).json()
+        self.assertEqual(group['group']['title'], self.group.title)
+        profile = self.client.get(
+            reverse('api:profile', kwargs={'username': self.author.username})
+        ).json()
+        self.assertEqual(profile['author']['posts_count'], POST_IN_PAGE + 3)
+        self.assertEqual(profile['author']['followers_count'], 1)
+        self.assertEqual(len(profile['results']), POST_IN_PAGE)
+
+    def test_not_found(self):
+        urls = [
+            reverse('api:group_list', kwargs={'slug': 'missing'}),
+            reverse('api:profile', kwargs={'username': 'missing'}),
+            reverse('api:post_detail', kwargs={'post_id': 10 ** 6}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertIn('detail', response.json())
+
+    def test_follow_requires_login(self):
+        response = self.client.get(FOLLOW)
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_follow_engines(self):
+        """Лента подписок одинакова для любого движка."""
+        self.client.force_login(self.reader)
+        expected = list(self.author.posts.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+        for engine in ('join', 'fanout', 'pull'):
+            with self.subTest(engine=engine), override_settings(
+                POSTS_FEED_ENGINE=engine
+            ):
+                ids = [post['id'] for post in self.collect(FOLLOW)]
+                self.assertEqual(ids, expected)
+
+    def test_cached_until_post_changes(self):
+        """Ответ гостю берётся из кэша страниц до правки поста."""
+        post = Post.objects.latest('id')
+        url = reverse('api:post_detail', kwargs={'post_id': post.id})
+        self.client.get(url)
+        Post.objects.filter(pk=post.pk).update(text='Без сигналов')
+        self.assertEqual(self.client.get(url).json()['text'], post.text)
+        post.text = 'Исправлено'
+        post.save()
+        self.assertEqual(self.client.get(url).json()['text'], 'Исправлено')
+
+    def test_conditional_get(self):
+        response = self.client.get(INDEX)
+        etag = response['ETag']
+        response = self.client.get(INDEX, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
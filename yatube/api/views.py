@@ -0,0 +1,121 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.views.decorators.http import condition
+
+from core.cache import generation_etag, tag_response
+from posts import feeds
+from posts.models import Group, Post, ProfileStats
+from posts.paginators import FEED_ORDERING, POST_IN_PAGE, CursorPaginator
+from posts.views import group_etag, index_etag, post_etag, profile_etag
+
+from .serializers import (FieldsError, parse_fields, post_values, row_tags,
+                          serialize_post)
+
+User = get_user_model()
+
+
+def error(status, detail):
+    return JsonResponse({'detail': detail}, status=status)
+
+
+def not_found():
+    return error(HTTPStatus.NOT_FOUND, 'Не найдено.')
+
+
+def follow_etag(request):
+    if request.user.is_authenticated:
+        return generation_etag(
+            request, 'feed:index', f'feed:follow:{request.user.id}'
+        )
+
+
+def posts_response(request, queryset, *tags, prefix='',
+                   ordering=FEED_ORDERING, extra=None):
+    """Страница постов по курсору ?after=/?before= с полями из ?fields=."""
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+    except FieldsError as exc:
+        return error(HTTPStatus.BAD_REQUEST, str(exc))
+    paginator = CursorPaginator(
+        post_values(queryset, fields, prefix, ordering),
+        POST_IN_PAGE,
+        ordering,
+    )
+    page = paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    data = dict(extra or {})
+    data.update({
+        'results': [serialize_post(row, fields, prefix) for row in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+    return tag_response(JsonResponse(data), *tags, *row_tags(page, prefix))
+
+
+@condition(etag_func=index_etag)
+def index(request):
+    return posts_response(request, Post.objects.all(), 'feed:index')
+
+
+@condition(etag_func=group_etag)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).values(
+        'id', 'slug', 'title', 'description'
+    ).first()
+    if group is None:
+        return not_found()
+    group_id = group.pop('id')
+    return posts_response(
+        request,
+        Post.objects.filter(group_id=group_id),
+        f'group:{slug}',
+        extra={'group': group},
+    )
+
+
+@condition(etag_func=profile_etag)
+def profile(request, username):
+    user = User.objects.filter(username=username).only('pk').first()
+    if user is None:
+        return not_found()
+    stats = ProfileStats.for_user(user)
+    author = {
+        'username': username,
+        'posts_count': stats.posts_count,
+        'followers_count': stats.followers_count,
+        'following_count': stats.following_count,
+    }
+    return posts_response(
+        request,
+        Post.objects.filter(author_id=user.pk),
+        f'author:{user.pk}',
+        extra={'author': author},
+    )
+
+
+@condition(etag_func=follow_etag)
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return error(HTTPStatus.UNAUTHORIZED, 'Нужна авторизация.')
+    queryset, prefix, ordering = feeds.follow_source(request.user)
+    return posts_response(
+        request, queryset, prefix=prefix, ordering=ordering
+    )
+
+
+@condition(etag_func=post_etag)
+def post_detail(request, post_id):
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+    except FieldsError as exc:
+        return error(HTTPStatus.BAD_REQUEST, str(exc))
+    row = post_values(Post.objects.filter(pk=post_id), fields).first()
+    if row is None:
+        return not_found()
+    return tag_response(
+        JsonResponse(serialize_post(row, fields)), *row_tags([row])
+    )
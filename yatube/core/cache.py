@@ -0,0 +1,63 @@
+import time
+
+from django.core.cache import cache
+
+GENERATION_KEY = 'generation:{name}'
+
+
+def _initial_generation():
+    # Начальное значение из часов: после вытеснения ключа из кэша
+    # поколение не вернётся к уже использованному номеру.
+    return time.time_ns()
+
+
+def get_generations(*names):
+    """Текущие номера поколений по именам, недостающие заводятся."""
+    keys = {GENERATION_KEY.format(name=name): name for name in names}
+    found = cache.get_many(keys)
+    missing = {
+        key: _initial_generation() for key in keys if key not in found
+    }
+    for key, value in missing.items():
+        cache.add(key, value, None)
+    if missing:
+        found.update(cache.get_many(missing))
+    return {keys[key]: value for key, value in found.items()}
+
+
+def bump_generations(*names):
+    """Сдвигает поколения: всё, что закэшировано со старыми, устаревает."""
+    for name in names:
+        key = GENERATION_KEY.format(name=name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), None)
+
+
+def generation_tag(*names):
+    """Строка из поколений для ключа кэша: меняется при любом сдвиге."""
+    generations = get_generations(*names)
+    return '.'.join(str(generations[name]) for name in names)
+
+
+def tag_response(response, *tags):
+    """Помечает ответ тегами для кэша страниц (см. core.middleware)."""
+    response.cache_tags = getattr(response, 'cache_tags', set()) | set(tags)
+    return response
+
+
+def post_tags(posts):
+    """Теги для страницы, показывающей эти посты."""
+    tags = set()
+    for post in posts:
+        tags.add(f'post:{post.pk}')
+        tags.add(f'author:{post.author_id}')
+        if post.group_id:
+            tags.add(f'group:{post.group.slug}')
+    return tags
+
+
+def generation_etag(request, *names):
+    """ETag страницы из поколений: проверка не трогает базу данных."""
+    return f'{request.user.pk or 0}-{generation_tag(*names)}'
@@ -0,0 +1,279 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS cache_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_totals VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_totals
+    SET entries = entries + 1, size = size + NEW.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_totals
+    SET entries = entries - 1, size = size - OLD.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache BEGIN
+    UPDATE cache_totals
+    SET size = size - OLD.size + NEW.size WHERE id = 1;
+END;
+'''
+
+# Время последнего чтения обновляется не чаще раза в секунду,
+# чтобы горячие ключи не превращали каждое чтение в запись.
+ACCESS_RESOLUTION = 1.0
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite (WAL), общий для всех процессов на машине.
+
+    LOCATION — путь к файлу базы. Помимо MAX_ENTRIES в OPTIONS можно
+    задать MAX_SIZE — предел суммарного размера значений в байтах.
+    При превышении пределов сначала удаляются просроченные записи,
+    затем давно не читанные (LRU).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = int(options.get('MAX_SIZE', 0)) or None
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self._path, timeout=30, isolation_level=None
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        with self._init_lock:
+            connection.executescript(SCHEMA)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def _write(self):
+        return _Transaction(self._connection())
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expiry(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _encode(self, value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _decode(self, blob):
+        return pickle.loads(blob)
+
+    def _fetch(self, keys):
+        now = time.time()
+        found = {}
+        stale = []
+        expired = []
+        connection = self._connection()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = connection.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({",".join("?" * len(chunk))})',
+                chunk,
+            )
+            for key, blob, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    expired.append(key)
+                    continue
+                found[key] = self._decode(blob)
+                if now - accessed > ACCESS_RESOLUTION:
+                    stale.append(key)
+        if stale or expired:
+            with self._write() as cursor:
+                cursor.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    [(now, key) for key in stale],
+                )
+                cursor.executemany(
+                    'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                    [(key, now) for key in expired],
+                )
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        mapped = {self._key(key, version): key for key in keys}
+        found = self._fetch(list(mapped))
+        return {mapped[key]: value for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def _store(self, cursor, rows, mode):
+        """Записывает строки и чистит кэш; возвращает число вставленных."""
+        now = time.time()
+        if self._max_size:
+            # Значение больше всего кэша вытеснило бы всё остальное.
+            oversized = [
+                (key,) for key, blob, _ in rows if len(blob) > self._max_size
+            ]
+            cursor.executemany('DELETE FROM cache WHERE key = ?', oversized)
+            rows = [row for row in rows if len(row[1]) <= self._max_size]
+        cursor.executemany(
+            f'INSERT OR {mode} INTO cache '
+            '(key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)',
+            [
+                (key, blob, expires, now, len(blob))
+                for key, blob, expires in rows
+            ],
+        )
+        stored = cursor.rowcount
+        self._cull(cursor, now)
+        return stored
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        row = (key, self._encode(value), self._expiry(timeout))
+        with self._write() as cursor:
+            self._store(cursor, [row], 'REPLACE')
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expiry(timeout)
+        rows = [
+            (self._key(key, version), self._encode(value), expires)
+            for key, value in data.items()
+        ]
+        with self._write() as cursor:
+            self._store(cursor, rows, 'REPLACE')
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        row = (key, self._encode(value), self._expiry(timeout))
+        with self._write() as cursor:
+            cursor.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            return self._store(cursor, [row], 'IGNORE') == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as cursor:
+            cursor.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self._expiry(timeout), key, time.time()),
+            )
+            return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._write() as cursor:
+            row = cursor.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self._decode(row[0]) + delta
+            blob = self._encode(value)
+            cursor.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (blob, len(blob), key),
+            )
+        return value
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._write() as cursor:
+            cursor.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        with self._write() as cursor:
+            cursor.executemany(
+                'DELETE FROM cache WHERE key = ?',
+                [(self._key(key, version),) for key in keys],
+            )
+
+    def clear(self):
+        with self._write() as cursor:
+            cursor.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт весь поток: открывать файл на каждый запрос
+        # дороже, чем держать его открытым.
+        pass
+
+    def _totals(self, cursor):
+        return cursor.execute(
+            'SELECT entries, size FROM cache_totals WHERE id = 1'
+        ).fetchone()
+
+    def _cull(self, cursor, now):
+        if not self._over_limits(*self._totals(cursor)):
+            return
+        cursor.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        entries, size = self._totals(cursor)
+        while self._over_limits(entries, size):
+            # Как и остальные бэкенды Django, удаляем сразу
+            # 1/CULL_FREQUENCY записей — самых давно читанных.
+            cursor.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (max(entries // self._cull_frequency, 1),),
+            )
+            entries, size = self._totals(cursor)
+
+    def _over_limits(self, entries, size):
+        return entries > self._max_entries or (
+            self._max_size is not None and size > self._max_size
+        )
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT: запись без гонок между процессами."""
+
+    def __init__(self, connection):
+        self.cursor = connection.cursor()
+
+    def __enter__(self):
+        self.cursor.execute('BEGIN IMMEDIATE')
+        return self.cursor
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.cursor.execute('ROLLBACK' if exc_type else 'COMMIT')
@@ -0,0 +1,68 @@
+"""Отправка почты через очередь в базе.
+
+OutboxEmailBackend только сохраняет письма в core.OutgoingEmail, так что
+запрос (например, сброс пароля) не ждёт почтового сервера. Отправляет
+их команда send_emails: пачками, через одно соединение бэкенда
+OUTBOX_EMAIL_BACKEND и не быстрее EMAIL_OUTBOX_RATE писем в секунду.
+"""
+import json
+
+from django.core.mail.backends.base import BaseEmailBackend
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+# Письмо с ошибкой отправки повторяется с задержкой, как задачи
+# (core.tasks.finish), но попыток больше: сервер бывает недоступен долго.
+MAX_ATTEMPTS = 5
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """Кладёт письма в очередь вместо отправки."""
+
+    def send_messages(self, email_messages):
+        now = timezone.now()
+        outgoing = [
+            OutgoingEmail(
+                from_email=message.from_email,
+                recipients=json.dumps(message.recipients()),
+                message=message.message().as_bytes(linesep='\r\n'),
+                max_attempts=MAX_ATTEMPTS,
+                run_after=now,
+            )
+            for message in email_messages if message.recipients()
+        ]
+        OutgoingEmail.objects.bulk_create(outgoing)
+        return len(outgoing)
+
+
+class _Message:
+    """Готовое MIME-сообщение для message() бэкендов Django."""
+
+    def __init__(self, raw):
+        self.raw = bytes(raw)
+
+    def as_bytes(self, linesep='\r\n'):
+        return self.raw
+
+    def as_string(self, linesep='\r\n'):
+        return self.raw.decode('utf-8', 'replace')
+
+    def get_charset(self):
+        return None
+
+
+class StoredEmail:
+    """Письмо из очереди в виде, который принимают бэкенды Django."""
+    encoding = None
+
+    def __init__(self, outgoing):
+        self.from_email = outgoing.from_email
+        self._recipients = json.loads(outgoing.recipients)
+        self._message = _Message(outgoing.message)
+
+    def recipients(self):
+        return self._recipients
+
+    def message(self):
+        return self._message
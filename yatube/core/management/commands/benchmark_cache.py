@@ -0,0 +1,61 @@
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache_backends import SQLiteCache
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает get/set/get_many кэша SQLite с locmem и файловым '
+        'бэкендами Django.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=1000)
+        parser.add_argument('--value-size', type=int, default=2048)
+        parser.add_argument('--batch', type=int, default=30)
+
+    def backends(self, directory):
+        params = {'OPTIONS': {'MAX_ENTRIES': 10 ** 6}}
+        return {
+            'locmem': LocMemCache('benchmark', params),
+            'file': FileBasedCache(f'{directory}/file', params),
+            'sqlite': SQLiteCache(f'{directory}/cache.sqlite3', params),
+        }
+
+    def timed(self, operation, count):
+        started = time.perf_counter()
+        operation()
+        return (time.perf_counter() - started) / count * 1e6
+
+    def handle(self, *args, keys, value_size, batch, **options):
+        value = 'x' * value_size
+        names = [f'key:{index}' for index in range(keys)]
+        batches = [
+            names[start:start + batch]
+            for start in range(0, keys, batch)
+        ]
+        self.stdout.write(
+            f'{"бэкенд":>7} {"set":>10} {"get":>10} '
+            f'{"get_many/" + str(batch):>14}   мкс на операцию'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for name, cache in self.backends(directory).items():
+                set_time = self.timed(
+                    lambda: [cache.set(key, value) for key in names], keys
+                )
+                get_time = self.timed(
+                    lambda: [cache.get(key) for key in names], keys
+                )
+                get_many_time = self.timed(
+                    lambda: [cache.get_many(chunk) for chunk in batches],
+                    len(batches),
+                )
+                self.stdout.write(
+                    f'{name:>7} {set_time:10.1f} {get_time:10.1f} '
+                    f'{get_many_time:14.1f}'
+                )
@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди core.Task. Задач берётся '
+        'не больше, чем свободных мест в пуле: остальные ждут в базе, '
+        'а рост очереди виден по метрикам (--stats).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.TASKS_WORKERS,
+            help='Размер пула; 0 — выполнять задачи в этом же потоке.',
+        )
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Пул процессов вместо потоков (для задач, нагружающих CPU).',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1,
+            help='Как часто в секундах проверять очередь, если она пуста.',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда готовых задач не останется.',
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help='Только вывести состояние очереди.',
+        )
+        parser.add_argument(
+            '--stats-interval', type=float, default=60,
+            help='Как часто в секундах печатать метрики воркера.',
+        )
+
+    def handle(self, *args, workers, processes, poll, burst, stats,
+               stats_interval, **options):
+        if stats:
+            self.report_queue()
+            return
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.workers = workers
+        self.done = self.errors = 0
+        self.started = self.reported = time.monotonic()
+        self.stopping = False
+        previous = {
+            number: signal.signal(number, self.stop)
+            for number in (signal.SIGINT, signal.SIGTERM)
+        }
+        pool = self.make_pool(workers, processes)
+        try:
+            self.loop(pool, poll, burst, stats_interval)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+            for number, handler in previous.items():
+                signal.signal(number, handler)
+        self.report()
+
+    def make_pool(self, workers, processes):
+        if not workers:
+            return None
+        if processes:
+            # spawn, а не fork: дочерний процесс не унаследует открытые
+            # соединения с базой и настраивает Django заново.
+            return ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        return ThreadPoolExecutor(workers, thread_name_prefix='tasks')
+
+    def stop(self, number, frame):
+        # Новых задач не берём, начатые доделываем.
+        self.stopping = True
+
+    def loop(self, pool, poll, burst, stats_interval):
+        running = {}
+        while True:
+            claimed = []
+            free = max(self.workers, 1) - len(running)
+            if not self.stopping and free > 0:
+                claimed = tasks.claim(self.worker, free)
+            self.dispatch(pool, claimed, running)
+            if running:
+                self.collect(running, poll)
+            elif not claimed:
+                if burst or self.stopping:
+                    return
+                time.sleep(poll)
+            if time.monotonic() - self.reported >= stats_interval:
+                self.report(len(running))
+
+    def dispatch(self, pool, claimed, running):
+        for task in claimed:
+            if pool is None:
+                self.finish(task, tasks.execute(task.name, task.payload))
+                continue
+            future = pool.submit(
+                tasks.execute_in_pool, task.name, task.payload
+            )
+            running[future] = task
+
+    def collect(self, running, poll):
+        finished, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+        for future in finished:
+            task = running.pop(future)
+            try:
+                error = future.result()
+            except Exception as exception:
+                # Например, процесс пула убит: задача не выполнена.
+                error = repr(exception)
+            self.finish(task, error)
+
+    def finish(self, task, error):
+        tasks.finish(task, error)
+        if error is None:
+            self.done += 1
+        else:
+            self.errors += 1
+            self.stderr.write(f'{task}: попытка {task.attempts}\n{error}')
+
+    def report(self, in_flight=0):
+        self.reported = time.monotonic()
+        elapsed = max(self.reported - self.started, 1e-6)
+        stats = tasks.queue_stats()
+        self.stdout.write(
+            f'Выполнено: {self.done} ({self.done / elapsed:.1f}/с), '
+            f'ошибок: {self.errors}, в работе: {in_flight}/{self.workers}, '
+            f'готово к запуску: {stats["ready"]}, '
+            f'задержка очереди: {stats["lag"]:.1f} с'
+        )
+
+    def report_queue(self):
+        stats = tasks.queue_stats()
+        for name, value in stats.items():
+            self.stdout.write(f'{name}: {value}')
@@ -0,0 +1,113 @@
+import os
+import smtplib
+import socket
+import time
+from contextlib import suppress
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from core import tasks
+from core.mail import StoredEmail
+from core.models import OutgoingEmail
+
+ORDERING = ('run_after', 'id')
+# Ошибки соединения, после которых стоит переподключиться.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError,
+                     socket.timeout)
+
+
+class Command(BaseCommand):
+    help = (
+        'Отправляет письма из очереди core.OutgoingEmail пачками через '
+        'одно соединение бэкенда OUTBOX_EMAIL_BACKEND, не быстрее '
+        '--rate писем в секунду.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.EMAIL_OUTBOX_BATCH
+        )
+        parser.add_argument(
+            '--rate', type=float, default=settings.EMAIL_OUTBOX_RATE,
+            help='Писем в секунду; 0 — без ограничения.',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=5,
+            help='Как часто в секундах проверять пустую очередь.',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда готовых писем не останется.',
+        )
+
+    def handle(self, *args, batch_size, rate, poll, burst, **options):
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.interval = 1 / rate if rate else 0
+        self.next_send = time.monotonic()
+        self.sent = self.errors = 0
+        self.connection = None
+        try:
+            while True:
+                batch = tasks.claim(
+                    self.worker, batch_size, OutgoingEmail, ORDERING
+                )
+                if batch:
+                    self.send_batch(batch)
+                    continue
+                # Пока очередь пуста, соединение с сервером не держим.
+                self.close()
+                if burst:
+                    break
+                time.sleep(poll)
+        finally:
+            self.close()
+        self.stdout.write(
+            f'Отправлено писем: {self.sent}, ошибок: {self.errors}'
+        )
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = get_connection(
+                settings.OUTBOX_EMAIL_BACKEND, fail_silently=False
+            )
+            self.connection.open()
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+
+    def throttle(self):
+        now = time.monotonic()
+        if self.next_send > now:
+            time.sleep(self.next_send - now)
+        self.next_send = max(self.next_send, now) + self.interval
+
+    def send_batch(self, batch):
+        for outgoing in batch:
+            self.throttle()
+            try:
+                self.send(outgoing)
+            except Exception as error:
+                self.errors += 1
+                self.stderr.write(f'{outgoing}: {error!r}')
+                tasks.finish(outgoing, repr(error))
+            else:
+                self.sent += 1
+                tasks.finish(outgoing)
+
+    def send(self, outgoing):
+        message = StoredEmail(outgoing)
+        try:
+            self.connect().send_messages([message])
+        except CONNECTION_ERRORS:
+            # Сервер мог закрыть долго простаивавшее соединение:
+            # одна попытка с новым, дальше письмо ждёт повтора.
+            with suppress(Exception):
+                self.close()
+            self.connect().send_messages([message])
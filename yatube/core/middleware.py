@@ -0,0 +1,54 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import get_generations
+
+PAGE_CACHE_KEY = 'page:{digest}'
+
+
+class AnonymousPageCacheMiddleware:
+    """Кэширует целые страницы для гостей с инвалидацией по тегам.
+
+    Вью помечает ответ тегами (core.cache.tag_response). В кэш кладётся
+    ответ вместе с поколениями его тегов; сдвиг поколения любого тега
+    (core.cache.bump_generations) делает запись недействительной.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 15)
+
+    def __call__(self, request):
+        if not self.is_cacheable_request(request):
+            return self.get_response(request)
+        key = PAGE_CACHE_KEY.format(digest=hashlib.md5(
+            request.build_absolute_uri().encode()
+        ).hexdigest())
+        entry = cache.get(key)
+        if entry is not None:
+            response, generations = entry
+            if get_generations(*generations) == generations:
+                return response
+        response = self.get_response(request)
+        if self.is_cacheable_response(response):
+            # Поколения читаются после рендеринга: правка во время него
+            # может продержаться в кэше до истечения timeout.
+            generations = get_generations(*response.cache_tags)
+            cache.set(key, (response, generations), self.timeout)
+        return response
+
+    def is_cacheable_request(self, request):
+        return (
+            request.method == 'GET'
+            and not request.user.is_authenticated
+        )
+
+    def is_cacheable_response(self, response):
+        return (
+            getattr(response, 'cache_tags', None)
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        )
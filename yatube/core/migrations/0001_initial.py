@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Функция')),
+                ('payload', models.TextField(verbose_name='Аргументы (JSON)')),
+                ('priority', models.PositiveSmallIntegerField(default=5, verbose_name='Приоритет')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('failed', 'Не выполнена')], default='queued', max_length=10, verbose_name='Состояние')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('run_after', models.DateTimeField(verbose_name='Не раньше')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Задача',
+                'verbose_name_plural': 'Задачи',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'priority', 'run_after', 'id'], name='task_queue_idx'),
+        ),
+    ]
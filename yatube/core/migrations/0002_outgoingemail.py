@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutgoingEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('failed', 'Не выполнена')], default='queued', max_length=10, verbose_name='Состояние')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('run_after', models.DateTimeField(verbose_name='Не раньше')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('from_email', models.CharField(max_length=254, verbose_name='Отправитель')),
+                ('recipients', models.TextField(verbose_name='Получатели')),
+                ('message', models.BinaryField(verbose_name='Письмо (MIME)')),
+            ],
+            options={
+                'verbose_name': 'Исходящее письмо',
+                'verbose_name_plural': 'Исходящие письма',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outgoingemail',
+            index=models.Index(fields=['status', 'run_after', 'id'], name='outgoing_email_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import models
+
+
+class QueueItem(models.Model):
+    """Запись очереди: её по очереди забирают воркеры (см. core.tasks)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Не выполнена'),
+    )
+
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField('Не раньше')
+    created = models.DateTimeField(auto_now_add=True)
+    # Пока срок не истёк, запись держит воркер locked_by; запись упавшего
+    # воркера после срока забирает другой.
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        abstract = True
+
+
+class Task(QueueItem):
+    """Фоновая задача в очереди (см. core.tasks)."""
+    name = models.CharField('Функция', max_length=200)
+    payload = models.TextField('Аргументы (JSON)')
+    # Меньше — срочнее.
+    priority = models.PositiveSmallIntegerField('Приоритет', default=5)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(
+                fields=['status', 'priority', 'run_after', 'id'],
+                name='task_queue_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+
+class OutgoingEmail(QueueItem):
+    """Письмо, ожидающее отправки командой send_emails (см. core.mail)."""
+    from_email = models.CharField('Отправитель', max_length=254)
+    # JSON-список адресов конверта, включая скрытые копии.
+    recipients = models.TextField('Получатели')
+    message = models.BinaryField('Письмо (MIME)')
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        indexes = [
+            models.Index(
+                fields=['status', 'run_after', 'id'],
+                name='outgoing_email_queue_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Письмо #{self.pk}'
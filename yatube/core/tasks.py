@@ -0,0 +1,160 @@
+"""Фоновые задачи без внешнего брокера.
+
+Задача — строка в таблице core.Task: enqueue() пишет её в текущей
+транзакции, поэтому задача появляется тогда же, когда и данные, ради
+которых она поставлена, и пропадает вместе с ними при откате.
+Выполняет задачи команда run_tasks в пуле потоков или процессов.
+
+Функция-задача помечается декоратором @task и ставится в очередь
+через func.enqueue(*args, **kwargs); аргументы должны сериализоваться
+в JSON. При TASKS_EAGER функция выполняется сразу, без очереди.
+"""
+import json
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connections
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+HIGH, NORMAL, LOW = 0, 5, 9
+# Сколько воркер держит задачу; после этого её заберёт другой воркер.
+LEASE = timedelta(minutes=10)
+# Повтор после ошибки: 10 с, 20 с, 40 с... но не реже раза в час.
+RETRY_DELAY = timedelta(seconds=10)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+
+def task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def enqueue(func, *args, priority=None, delay=None, **kwargs):
+    """Ставит вызов func(*args, **kwargs) в очередь; возвращает Task."""
+    if getattr(settings, 'TASKS_EAGER', False):
+        func(*args, **kwargs)
+        return None
+    if priority is None:
+        priority = getattr(func, 'priority', NORMAL)
+    return Task.objects.create(
+        name=task_name(func),
+        payload=json.dumps(
+            {'args': args, 'kwargs': kwargs}, cls=DjangoJSONEncoder
+        ),
+        priority=priority,
+        max_attempts=getattr(func, 'max_attempts', 3),
+        run_after=timezone.now() + (delay or timedelta()),
+    )
+
+
+def task(priority=NORMAL, max_attempts=3):
+    """Декоратор функции-задачи: добавляет ей метод enqueue."""
+    def decorator(func):
+        func.priority = priority
+        func.max_attempts = max_attempts
+        func.enqueue = lambda *args, **kwargs: enqueue(func, *args, **kwargs)
+        return func
+    return decorator
+
+
+def claim(worker, limit, model=Task,
+          ordering=('priority', 'run_after', 'id')):
+    """Забирает до limit готовых записей очереди model.
+
+    По умолчанию — задачи, самые срочные первыми.
+    """
+    now = timezone.now()
+    # Задача, на которой воркеры падали max_attempts раз, больше
+    # не выдаётся.
+    model.objects.filter(
+        status=model.RUNNING, locked_until__lt=now,
+        attempts__gte=F('max_attempts'),
+    ).update(
+        status=model.FAILED, locked_by='', locked_until=None,
+        last_error='Воркер не завершил задачу за отведённое время.',
+    )
+    ready = model.objects.filter(
+        Q(status=model.QUEUED, run_after__lte=now)
+        | Q(status=model.RUNNING, locked_until__lt=now)
+    ).order_by(*ordering).values_list(
+        'pk', 'status', 'locked_until'
+    )[:limit]
+    claimed = []
+    for pk, status, locked_until in ready:
+        # Условное обновление: если задачу успел забрать другой воркер,
+        # строка уже не подходит под фильтр.
+        taken = model.objects.filter(
+            pk=pk, status=status, locked_until=locked_until
+        ).update(
+            status=model.RUNNING,
+            locked_by=worker,
+            locked_until=now + LEASE,
+            attempts=F('attempts') + 1,
+        )
+        if taken:
+            claimed.append(pk)
+    return list(model.objects.filter(pk__in=claimed).order_by(*ordering))
+
+
+def execute(name, payload):
+    """Выполняет задачу; None при успехе, иначе текст ошибки."""
+    try:
+        arguments = json.loads(payload)
+        import_string(name)(*arguments['args'], **arguments['kwargs'])
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+
+def execute_in_pool(name, payload):
+    """execute() для потока или процесса пула: у них свои соединения."""
+    close_old_connections()
+    try:
+        return execute(name, payload)
+    finally:
+        connections.close_all()
+
+
+def finish(task, error=None):
+    """Записывает итог: выполненная запись удаляется из очереди."""
+    model = type(task)
+    # Запись, которую после истечения аренды забрал другой воркер,
+    # остаётся ему.
+    current = model.objects.filter(pk=task.pk, locked_by=task.locked_by)
+    if error is None:
+        current.delete()
+        return
+    if task.attempts >= task.max_attempts:
+        fields = {'status': model.FAILED}
+    else:
+        delay = min(
+            RETRY_DELAY * 2 ** (task.attempts - 1), MAX_RETRY_DELAY
+        )
+        fields = {
+            'status': model.QUEUED, 'run_after': timezone.now() + delay,
+        }
+    current.update(
+        locked_by='', locked_until=None, last_error=error, **fields
+    )
+
+
+def queue_stats(model=Task):
+    """Глубина очереди по состояниям и задержка самой старой готовой."""
+    now = timezone.now()
+    stats = dict.fromkeys((model.QUEUED, model.RUNNING, model.FAILED), 0)
+    stats.update(model.objects.order_by().values_list('status').annotate(
+        total=Count('id')
+    ))
+    ready = model.objects.filter(
+        status=model.QUEUED, run_after__lte=now
+    ).aggregate(total=Count('id'), oldest=Min('run_after'))
+    stats['ready'] = ready['total']
+    stats['lag'] = (
+        (now - ready['oldest']).total_seconds() if ready['oldest'] else 0.0
+    )
+    return stats
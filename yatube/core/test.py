@@ -1,6 +1,33 @@
+import json
+import multiprocessing
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+from datetime import timedelta
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
-from django.test import Client, TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.mail import send_mail
+from django.core.management import call_command
+from django.db import transaction
+from django.test import (Client, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Group, Post
+
+from . import tasks
+from .cache_backends import SQLiteCache
+from .models import OutgoingEmail, Task
+
+User = get_user_model()
 
 
 class StaticURLTests(TestCase):
@@ -16,3 +43,340 @@ class StaticURLTests(TestCase):
         """Проверка шаблона для адреса /not_found/."""
         response = self.guest_client.get('/not_found/')
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='А', slug='a', description='')
+        cls.other_group = Group.objects.create(
+            title='Б', slug='b', description=''
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.user, group=cls.group
+        )
+        cls.POST_DETAIL = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.id}
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_repeat_visit_skips_database(self):
+        """Повторный заход гостя отдаётся из кэша без запросов к БД."""
+        first = self.guest_client.get(self.POST_DETAIL)
+        with self.assertNumQueries(0):
+            second = self.guest_client.get(self.POST_DETAIL)
+        self.assertEqual(first.content, second.content)
+
+    def test_post_edit_purges_tagged_pages(self):
+        """Правка поста сбрасывает страницы с его тегом, и только их."""
+        group_url = reverse('posts:group_list', kwargs={'slug': 'a'})
+        other_url = reverse('posts:group_list', kwargs={'slug': 'b'})
+        for url in (self.POST_DETAIL, group_url, other_url):
+            self.guest_client.get(url)
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        for url in (self.POST_DETAIL, group_url):
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url), 'Исправленный пост'
+                )
+        with self.assertNumQueries(0):
+            self.guest_client.get(other_url)
+
+    def test_authorized_user_not_cached(self):
+        client = Client()
+        client.force_login(self.user)
+        client.get(self.POST_DETAIL)
+        response = client.get(self.POST_DETAIL)
+        self.assertIsNotNone(response.context)
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        self.cache.set('a', {'x': 1})
+        self.assertTrue(self.cache.add('b', 1))
+        self.assertFalse(self.cache.add('b', 2))
+        self.assertEqual(self.cache.incr('b', 5), 6)
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': {'x': 1}, 'b': 6}
+        )
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('c')
+
+    def test_expired_entry_is_missing(self):
+        self.cache.set('a', 1, timeout=0)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.add('a', 2))
+
+    def test_evicts_least_recently_used(self):
+        """При переполнении вытесняются давно не читанные записи."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for index, key in enumerate('abc'):
+            with mock.patch('time.time', return_value=index * 10):
+                cache.set(key, index, None)
+        with mock.patch('time.time', return_value=30):
+            cache.get('a')
+            cache.set('d', 3, None)
+        self.assertEqual(cache.get_many('abcd'), {'a': 0, 'c': 2, 'd': 3})
+
+    def test_size_limit(self):
+        cache = self.make_cache(MAX_SIZE=1000)
+        for index in range(10):
+            cache.set(index, 'x' * 200)
+        totals = cache._totals(cache._connection().cursor())
+        self.assertLessEqual(totals[1], 1000)
+
+    def test_shared_between_processes(self):
+        """Запись из другого процесса видна в этом."""
+        process = multiprocessing.get_context('fork').Process(
+            target=self.make_cache().set, args=('from_child', 42)
+        )
+        process.start()
+        process.join()
+        self.assertEqual(self.cache.get('from_child'), 42)
+
+
+CALLS = []
+
+
+@tasks.task(priority=tasks.LOW)
+def record_call(value):
+    CALLS.append(value)
+
+
+@tasks.task(max_attempts=2)
+def fail_always():
+    raise ValueError('сбой задачи')
+
+
+@override_settings(TASKS_EAGER=False)
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def run_tasks(self, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'run_tasks', burst=True, workers=0, stdout=out, stderr=err,
+            **options
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_enqueue_writes_outbox_row(self):
+        record_call.enqueue('a')
+        task = Task.objects.get()
+        self.assertEqual(task.name, 'core.test.record_call')
+        self.assertEqual(task.priority, tasks.LOW)
+        self.assertEqual(CALLS, [])
+
+    def test_enqueue_rolled_back_with_transaction(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            record_call.enqueue('a')
+            raise ValueError
+        self.assertFalse(Task.objects.exists())
+
+    def test_worker_runs_urgent_tasks_first(self):
+        record_call.enqueue('low')
+        tasks.enqueue(record_call, 'high', priority=tasks.HIGH)
+        record_call.enqueue('later', delay=timedelta(hours=1))
+        self.run_tasks()
+        self.assertEqual(CALLS, ['high', 'low'])
+        self.assertEqual(
+            list(Task.objects.values_list('payload', flat=True)),
+            ['{"args": ["later"], "kwargs": {}}'],
+        )
+
+    def test_failed_task_retried_then_marked_failed(self):
+        fail_always.enqueue()
+        _, err = self.run_tasks()
+        self.assertIn('ValueError', err)
+        task = Task.objects.get()
+        self.assertEqual(
+            (task.status, task.attempts), (Task.QUEUED, 1)
+        )
+        self.assertGreater(task.run_after, timezone.now())
+        self.assertIn('сбой задачи', task.last_error)
+        Task.objects.update(run_after=timezone.now())
+        self.run_tasks()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+
+    def test_expired_lease_is_reclaimed(self):
+        task = record_call.enqueue('lost')
+        Task.objects.filter(pk=task.pk).update(
+            status=Task.RUNNING, locked_by='dead:1', attempts=1,
+            locked_until=timezone.now() - timedelta(seconds=1),
+        )
+        self.run_tasks()
+        self.assertEqual(CALLS, ['lost'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_stale_worker_keeps_reclaimed_task(self):
+        """Воркер с истёкшей арендой не удаляет задачу, которую уже
+        выполняет другой."""
+        record_call.enqueue('slow')
+        stale = tasks.claim('dead:1', 1)[0]
+        Task.objects.update(locked_by='alive:2')
+        tasks.finish(stale)
+        self.assertEqual(Task.objects.get().locked_by, 'alive:2')
+
+    def test_stats_report_backlog(self):
+        record_call.enqueue('a')
+        Task.objects.update(run_after=timezone.now() - timedelta(minutes=1))
+        out = StringIO()
+        call_command('run_tasks', stats=True, stdout=out)
+        self.assertIn('ready: 1', out.getvalue())
+        self.assertGreaterEqual(tasks.queue_stats()['lag'], 60)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_mode_skips_queue(self):
+        record_call.enqueue('now')
+        self.assertEqual(CALLS, ['now'])
+        self.assertFalse(Task.objects.exists())
+
+
+@override_settings(TASKS_EAGER=False)
+class TaskPoolTests(TransactionTestCase):
+    def test_thread_pool_runs_tasks(self):
+        for number in range(5):
+            record_call.enqueue(number)
+        call_command(
+            'run_tasks', burst=True, workers=2, poll=0.05,
+            stdout=StringIO(), stderr=StringIO(),
+        )
+        self.assertEqual(sorted(CALLS[-5:]), list(range(5)))
+        self.assertFalse(Task.objects.exists())
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Минимальный SMTP-сервер для тестов: складывает письма в список."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 stand-in')
+        recipients = []
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.reply('250 stand-in')
+            elif verb == 'RCPT' and 'refused' in command:
+                self.reply('550 no such user')
+            elif verb == 'RCPT':
+                recipients.append(command)
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 go ahead')
+                data = b''.join(iter(self.rfile.readline, b'.\r\n'))
+                self.server.messages.append((recipients, data))
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.smtp = SMTPStandIn()
+        self.addCleanup(self.smtp.stop)
+        smtp_settings = override_settings(
+            EMAIL_BACKEND='core.mail.OutboxEmailBackend',
+            OUTBOX_EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.smtp.server_address[1],
+        )
+        smtp_settings.enable()
+        self.addCleanup(smtp_settings.disable)
+
+    def send_emails(self, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'send_emails', burst=True, rate=0, stdout=out, stderr=err,
+            **options
+        )
+        return err.getvalue()
+
+    def test_password_reset_does_not_wait_for_smtp(self):
+        User.objects.create_user(
+            username='forgetful', email='me@example.com', password='secret'
+        )
+        self.client.post(
+            reverse('password_reset'), {'email': 'me@example.com'}
+        )
+        self.assertEqual(self.smtp.connections, 0)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(json.loads(email.recipients), ['me@example.com'])
+        self.send_emails()
+        self.assertEqual(len(self.smtp.messages), 1)
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+    def test_batch_sent_over_one_connection(self):
+        for number in range(5):
+            send_mail(
+                f'Письмо {number}', 'Текст', 'site@example.com',
+                [f'user{number}@example.com'],
+            )
+        self.assertEqual(OutgoingEmail.objects.count(), 5)
+        self.send_emails(batch_size=2)
+        self.assertEqual(len(self.smtp.messages), 5)
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertIn(b'Subject: =?utf-8?', self.smtp.messages[0][1])
+
+    def test_rate_limit_spaces_messages(self):
+        for number in range(3):
+            send_mail('Тема', 'Текст', 'site@example.com', ['a@example.com'])
+        started = time.monotonic()
+        call_command(
+            'send_emails', burst=True, rate=20, stdout=StringIO()
+        )
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertEqual(len(self.smtp.messages), 3)
+
+    def test_refused_message_retried_later(self):
+        send_mail('Тема', 'Текст', 'site@example.com', ['refused@example.com'])
+        send_mail('Тема', 'Текст', 'site@example.com', ['ok@example.com'])
+        err = self.send_emails()
+        self.assertIn('SMTPRecipientsRefused', err)
+        self.assertEqual(len(self.smtp.messages), 1)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(
+            (email.status, email.attempts), (OutgoingEmail.QUEUED, 1)
+        )
+        self.assertGreater(email.run_after, timezone.now())
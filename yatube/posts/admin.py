@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Post, Group
+from .search import get_backend
 
 
 @admin.register(Post)
@@ -17,5 +18,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        matching = get_backend().matching(search_term)
+        return queryset.filter(pk__in=matching), False
+
 
 admin.site.register(Group)
@@ -0,0 +1,44 @@
+from django.core.cache import cache
+
+from .models import Comment
+from .paginators import CursorPaginator
+
+COMMENTS_IN_PAGE = 20
+COMMENTS_ORDERING = ('-created', '-id')
+COMMENTS_COUNT_KEY = 'posts:comments_count:{post_id}'
+
+
+def comments_page(post_id, after=None):
+    """Страница комментариев поста после курсора after (или первая)."""
+    comments = Comment.objects.filter(
+        post_id=post_id
+    ).select_related('author')
+    paginator = CursorPaginator(comments, COMMENTS_IN_PAGE, COMMENTS_ORDERING)
+    return paginator.get_cursor_page(after=after)
+
+
+def comment_as_dict(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def comments_count(post_id):
+    """Число комментариев поста; COUNT(*) только при промахе кэша."""
+    key = COMMENTS_COUNT_KEY.format(post_id=post_id)
+    count = cache.get(key)
+    if count is None:
+        count = Comment.objects.filter(post_id=post_id).count()
+        cache.add(key, count, None)
+    return count
+
+
+def adjust_comments_count(post_id, delta):
+    """Сдвигает закэшированный счётчик; если его нет — посчитается заново."""
+    try:
+        cache.incr(COMMENTS_COUNT_KEY.format(post_id=post_id), delta)
+    except ValueError:
+        pass
@@ -0,0 +1,179 @@
+"""Потоковая выгрузка постов автора или группы.
+
+Посты читаются iterator() пачками по EXPORT_CHUNK, комментарии —
+запросами по LOOKUP_CHUNK постов, так что память не растёт с числом
+постов. Записи JSONL совместимы с командой import_content.
+"""
+import csv
+import io
+import itertools
+import json
+import zipfile
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from .models import Comment
+
+EXPORT_CHUNK = 1000
+# Сколько значений уходит в один IN (...): у SQLite предел — 999.
+LOOKUP_CHUNK = 400
+EXPORT_FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'zip': 'application/zip',
+}
+CSV_COLUMNS = ('type', 'id', 'post', 'author', 'text', 'group', 'pub_date',
+               'image')
+IMAGES_DIR = 'images/'
+
+
+def _post_rows(posts):
+    return posts.order_by('pub_date', 'id').values(
+        'id', 'text', 'pub_date', 'image',
+        author_name=F('author__username'),
+        group_slug=F('group__slug'),
+    ).iterator(chunk_size=EXPORT_CHUNK)
+
+
+def _comments(post_ids):
+    comments = defaultdict(list)
+    post_ids = list(post_ids)
+    for start in range(0, len(post_ids), LOOKUP_CHUNK):
+        rows = Comment.objects.filter(
+            post_id__in=post_ids[start:start + LOOKUP_CHUNK]
+        ).order_by('created', 'id').values(
+            'post_id', 'text', 'created', author_name=F('author__username')
+        )
+        for row in rows:
+            comments[row['post_id']].append({
+                'author': row['author_name'],
+                'text': row['text'],
+                'created': row['created'],
+            })
+    return comments
+
+
+def export_records(posts, with_comments=False, image=None):
+    """Словари постов (type='post') в порядке публикации.
+
+    image — во что превратить имя файла картинки (по умолчанию в URL).
+    """
+    image = image or default_storage.url
+    rows = _post_rows(posts)
+    while True:
+        chunk = list(itertools.islice(rows, EXPORT_CHUNK))
+        if not chunk:
+            return
+        comments = (
+            _comments([row['id'] for row in chunk]) if with_comments else {}
+        )
+        for row in chunk:
+            record = {
+                'type': 'post',
+                'id': row['id'],
+                'author': row['author_name'],
+                'text': row['text'],
+                'group': row['group_slug'],
+                'pub_date': row['pub_date'],
+                'image': image(row['image']) if row['image'] else None,
+            }
+            if with_comments:
+                record['comments'] = comments.get(row['id'], [])
+            yield record
+
+
+def _jsonl_line(record):
+    return json.dumps(
+        record, cls=DjangoJSONEncoder, ensure_ascii=False
+    ).encode() + b'\n'
+
+
+def stream_jsonl(posts, with_comments=False):
+    for record in export_records(posts, with_comments):
+        yield _jsonl_line(record)
+
+
+class _Buffer:
+    """Файлоподобный приёмник: писатель пишет, генератор забирает."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Отдаёт накопленное (если есть) и очищает буфер."""
+        if self.parts:
+            data = b''.join(self.parts)
+            self.parts = []
+            yield data
+
+
+def stream_csv(posts, with_comments=False):
+    """Строка на пост; комментарии — отдельными строками type=comment."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_COLUMNS)
+    writer.writeheader()
+    for record in export_records(posts, with_comments):
+        comments = record.pop('comments', [])
+        writer.writerow(record)
+        for comment in comments:
+            writer.writerow({
+                'type': 'comment',
+                'post': record['id'],
+                'author': comment['author'],
+                'text': comment['text'],
+                'pub_date': comment['created'],
+            })
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def stream_zip(posts, with_comments=False):
+    """Архив с картинками в images/ и posts.jsonl.
+
+    Поле image в posts.jsonl — путь к картинке внутри архива.
+    """
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        names = posts.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        for name in names.iterator(chunk_size=EXPORT_CHUNK):
+            if not default_storage.exists(name):
+                continue
+            # Картинки уже сжаты: храним как есть.
+            info = zipfile.ZipInfo(IMAGES_DIR + name)
+            with default_storage.open(name, 'rb') as source, \
+                    archive.open(info, 'w', force_zip64=True) as entry:
+                for data in source.chunks():
+                    entry.write(data)
+                    yield from buffer.drain()
+        with archive.open('posts.jsonl', 'w', force_zip64=True) as entry:
+            for record in export_records(
+                posts, with_comments, lambda name: IMAGES_DIR + name
+            ):
+                entry.write(_jsonl_line(record))
+                yield from buffer.drain()
+    yield from buffer.drain()
+
+
+STREAMS = {
+    'jsonl': stream_jsonl,
+    'csv': stream_csv,
+    'zip': stream_zip,
+}
+
+
+def stream_export(posts, file_format='jsonl', with_comments=False):
+    """Генератор байтов выгрузки в формате из EXPORT_FORMATS."""
+    return STREAMS[file_format](posts, with_comments)
@@ -0,0 +1,219 @@
+import heapq
+import itertools
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import FeedEntry, Follow, Post
+from .paginators import (FEED_ORDERING, POST_IN_PAGE, CursorPaginator,
+                         paginate)
+
+FEED_BATCH_SIZE = 1000
+RECENT_POSTS_LIMIT = 200
+RECENT_POSTS_KEY = 'posts:recent:{author_id}'
+# Сколько значений уходит в один IN (...): у SQLite предел — 999.
+LOOKUP_CHUNK = 400
+
+
+def _insert_entries(entries):
+    FeedEntry.objects.bulk_create(
+        entries, batch_size=FEED_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _insert_entries([
+        FeedEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    ])
+
+
+def fan_out_posts(posts):
+    """То же для пачки постов: один запрос подписчиков на всех авторов."""
+    followers = defaultdict(list)
+    follows = Follow.objects.filter(
+        author_id__in={post.author_id for post in posts}
+    ).values_list('author_id', 'user_id')
+    for author_id, user_id in follows.iterator():
+        followers[author_id].append(user_id)
+    _insert_entries([
+        FeedEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for post in posts
+        for user_id in followers[post.author_id]
+    ])
+
+
+def backfill_follow(user_id, author_id):
+    """Добавляет в ленту подписчика все посты автора."""
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+    batch = []
+    for post_id, pub_date in posts.iterator(chunk_size=FEED_BATCH_SIZE):
+        batch.append(
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        )
+        if len(batch) >= FEED_BATCH_SIZE:
+            _insert_entries(batch)
+            batch = []
+    _insert_entries(batch)
+
+
+def prune_follow(user_id, author_id):
+    """Убирает из ленты подписчика посты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def invalidate_recent_posts(author_id):
+    cache.delete(RECENT_POSTS_KEY.format(author_id=author_id))
+
+
+def _recent_rows(author_ids):
+    """Свежие посты авторов одним запросом: ROW_NUMBER() по каждому
+    автору отсекает всё старше RECENT_POSTS_LIMIT.
+    """
+    ranked = Post.objects.filter(author_id__in=author_ids).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        )
+    ).order_by().values('id', 'author_id', 'pub_date', 'position')
+    sql, params = ranked.query.sql_with_params()
+    # Фильтровать по оконной функции Django 2.2 не умеет, поэтому
+    # внешний запрос пишется руками; raw() приводит pub_date к datetime.
+    # Без ORDER BY строки идут прямо из индекса автора, без сортировки.
+    return Post.objects.raw(
+        f'SELECT id, author_id, pub_date FROM ({sql}) WHERE position <= %s',
+        [*params, RECENT_POSTS_LIMIT],
+    )
+
+
+def recent_posts(author_ids):
+    """Ограниченные списки (pub_date, id) свежих постов каждого автора.
+
+    Авторы, которых нет в кеше, читаются пачками по LOOKUP_CHUNK.
+    """
+    keys = {
+        RECENT_POSTS_KEY.format(author_id=author_id): author_id
+        for author_id in author_ids
+    }
+    lists = {
+        keys[key]: value for key, value in cache.get_many(keys).items()
+    }
+    missing = sorted(set(author_ids) - set(lists))
+    for start in range(0, len(missing), LOOKUP_CHUNK):
+        chunk = missing[start:start + LOOKUP_CHUNK]
+        fresh = {author_id: [] for author_id in chunk}
+        for post in _recent_rows(chunk):
+            fresh[post.author_id].append((post.pub_date, post.id))
+        for items in fresh.values():
+            items.sort(reverse=True)
+        lists.update(fresh)
+        cache.set_many({
+            RECENT_POSTS_KEY.format(author_id=author_id): items
+            for author_id, items in fresh.items()
+        }, None)
+    return lists
+
+
+def _join_page(user, params):
+    posts = Post.objects.filter(
+        author__following__user=user
+    ).select_related('author', 'group')
+    return paginate(params, posts)
+
+
+def _fanout_page(user, params):
+    entries = user.feed_entries.select_related(
+        'post__author', 'post__group'
+    )
+    page_obj = paginate(params, entries, ordering=('-pub_date', '-post_id'))
+    page_obj.object_list = [entry.post for entry in page_obj]
+    return page_obj
+
+
+def _pull_page(user, params):
+    """Лента слиянием списков свежих постов авторов (k-way merge).
+
+    Если страница уходит глубже, чем хранят усечённые списки (в любую
+    сторону), отдаёт её запросом с join.
+    """
+    if 'page' in params:
+        return _join_page(user, params)
+    paginator = CursorPaginator(
+        Post.objects.filter(author__following__user=user), POST_IN_PAGE
+    )
+    after = paginator.decode_cursor(params.get('after', ''))
+    before = paginator.decode_cursor(params.get('before', ''))
+    author_ids = Follow.objects.filter(
+        user=user
+    ).values_list('author_id', flat=True)
+    lists = recent_posts(list(author_ids))
+    horizon = max(
+        (items[-1] for items in lists.values()
+         if len(items) >= RECENT_POSTS_LIMIT),
+        default=None,
+    )
+    merged = heapq.merge(*lists.values(), reverse=True)
+    if before:
+        if horizon is not None and tuple(before) < horizon:
+            return _join_page(user, params)
+        newer = list(itertools.takewhile(
+            lambda key: key > tuple(before), merged
+        ))
+        keys = newer[-POST_IN_PAGE:]
+        has_previous = len(newer) > POST_IN_PAGE
+        has_next = True
+    else:
+        if after:
+            merged = itertools.dropwhile(
+                lambda key: key >= tuple(after), merged
+            )
+        keys = list(itertools.islice(merged, POST_IN_PAGE + 1))
+        has_next = len(keys) > POST_IN_PAGE
+        keys = keys[:POST_IN_PAGE]
+        if horizon is not None and (not has_next or keys[-1] < horizon):
+            return _join_page(user, params)
+        has_previous = bool(after)
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [post_id for _, post_id in keys]
+    )
+    items = [posts[post_id] for _, post_id in keys if post_id in posts]
+    return paginator.make_page(items, has_next, has_previous)
+
+
+FEED_ENGINES = {
+    'join': _join_page,
+    'fanout': _fanout_page,
+    'pull': _pull_page,
+}
+
+
+def feed_engine():
+    return getattr(settings, 'POSTS_FEED_ENGINE', 'fanout')
+
+
+def follow_source(user):
+    """Ленту подписок для выборок через values(): (queryset, префикс
+    полей поста, сортировка). Движок pull здесь сводится к join.
+    """
+    if feed_engine() == 'fanout':
+        return user.feed_entries.all(), 'post__', ('-pub_date', '-post_id')
+    return (
+        Post.objects.filter(author__following__user=user), '', FEED_ORDERING
+    )
+
+
+def follow_page(user, params):
+    """Страница ленты подписок движком из settings.POSTS_FEED_ENGINE."""
+    return FEED_ENGINES[feed_engine()](user, params)
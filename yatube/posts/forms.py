@@ -1,5 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 
+from . import images
 from .models import Post, Comment
 
 
@@ -15,6 +18,27 @@ class PostForm(forms.ModelForm):
             raise forms.ValidationError('А что читать то?')
         return data
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        self.image_info = None
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            image, self.image_info = images.normalize(image)
+        except (OSError, Image.DecompressionBombError):
+            raise forms.ValidationError(
+                'Не удалось обработать картинку.', code='invalid_image'
+            )
+        return image
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            info = getattr(self, 'image_info', None)
+            self.instance.image_width = info and info.width
+            self.instance.image_height = info and info.height
+            self.instance.image_placeholder = info.placeholder if info else ''
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,129 @@
+"""Приведение загруженных картинок к виду, в котором они хранятся.
+
+Оригинал уменьшается до POSTS_IMAGE_MAX_SIDE по большей стороне,
+поворачивается по EXIF и перекодируется без метаданных: фотографии —
+в JPEG, графика и картинки с прозрачностью — в PNG, анимация
+пересохраняется покадрово в своём формате. Размеры и
+крошечное превью для размытой заглушки сохраняются в модели, чтобы
+шаблону не открывать файл.
+"""
+import base64
+import io
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, ImageSequence
+
+# Заглушка — картинка не больше 16 пикселей по стороне: в data URI
+# она занимает несколько сотен байт, размывает её браузер.
+PLACEHOLDER_SIDE = 16
+PHOTO_FORMATS = {'JPEG', 'MPO', 'WEBP'}
+# Форматы настоящей анимации. У MPO (стереоснимки, серии с телефона)
+# тоже несколько кадров, но хранится он как фотография по первому.
+ANIMATED_FORMATS = {'GIF', 'PNG', 'WEBP'}
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+ORIENTATION_TAG = 0x0112
+# Значения Orientation, при которых ширина и высота меняются местами.
+ROTATED = {5, 6, 7, 8}
+
+ImageInfo = namedtuple('ImageInfo', 'width height placeholder')
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def placeholder(image):
+    """Data URI крошечной копии картинки."""
+    preview = image.convert('RGBA' if has_alpha(image) else 'RGB')
+    preview.thumbnail((PLACEHOLDER_SIDE, PLACEHOLDER_SIDE), Image.BILINEAR)
+    buffer = io.BytesIO()
+    preview.save(buffer, 'PNG', optimize=True)
+    data = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{data}'
+
+
+def describe(file):
+    """Размеры и заглушка уже сохранённой картинки."""
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        if image.getexif().get(ORIENTATION_TAG) in ROTATED:
+            width, height = height, width
+        image.draft('RGB', (PLACEHOLDER_SIDE * 8, PLACEHOLDER_SIDE * 8))
+        return ImageInfo(
+            width, height, placeholder(ImageOps.exif_transpose(image))
+        )
+
+
+def animation(image, max_side):
+    """Кадры анимации, уменьшенные до max_side, без метаданных."""
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 100))
+        frame = frame.convert('RGBA')
+        # convert() копирует info, а из него GIF берёт комментарий.
+        frame.info = {}
+        frame.thumbnail((max_side, max_side), Image.LANCZOS)
+        frames.append(frame)
+    options = {'save_all': True, 'append_images': frames[1:],
+               'duration': durations}
+    if 'loop' in image.info:
+        options['loop'] = image.info['loop']
+    buffer = io.BytesIO()
+    # Кадры сохраняются заново: комментарии, XMP и EXIF исходника
+    # в файл не попадают.
+    first = frames[0]
+    first.save(buffer, image.format, **options)
+    return buffer.getvalue(), ImageInfo(*first.size, placeholder(first))
+
+
+def normalize(upload):
+    """Перекодированная картинка (ContentFile) и её ImageInfo."""
+    max_side = settings.POSTS_IMAGE_MAX_SIDE
+    upload.seek(0)
+    with Image.open(upload) as image:
+        if (image.format in ANIMATED_FORMATS
+                and getattr(image, 'is_animated', False)):
+            # Анимация остаётся в своём формате: в JPEG или PNG
+            # уцелел бы только первый кадр.
+            data, info = animation(image, max_side)
+            return ContentFile(data, name=upload.name), info
+        # У многокадровых фотографий (MPO) берётся первый кадр.
+        image.seek(0)
+        source_format = image.format
+        # JPEG умеет декодироваться сразу в уменьшенном масштабе:
+        # снимок на 20 мегапикселей не разворачивается в память целиком.
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        icc_profile = image.info.get('icc_profile')
+        target_format = (
+            'JPEG' if source_format in PHOTO_FORMATS and not has_alpha(image)
+            else 'PNG'
+        )
+        if max(image.size) > max_side or image.mode not in (
+            'L', 'RGB', 'CMYK', 'P', 'LA', 'RGBA'
+        ):
+            image = image.convert('RGBA' if has_alpha(image) else 'RGB')
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if target_format == 'JPEG' and image.mode not in (
+            'L', 'RGB', 'CMYK'
+        ):
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        # Сохраняется только пиксельное содержимое и цветовой профиль:
+        # EXIF с координатами и моделью камеры в файл не попадает.
+        options = {'optimize': True, 'icc_profile': icc_profile, 'exif': b''}
+        if target_format == 'JPEG':
+            options.update(
+                quality=settings.POSTS_IMAGE_ORIGINAL_QUALITY,
+                progressive=True,
+            )
+        image.save(buffer, target_format, **options)
+        info = ImageInfo(*image.size, placeholder(image))
+    name = os.path.splitext(upload.name)[0] + EXTENSIONS[target_format]
+    return ContentFile(buffer.getvalue(), name=name), info
@@ -0,0 +1,52 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.http import QueryDict
+from django.test.utils import CaptureQueriesContext
+
+from posts import feeds
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время построения первой и следующей страницы ленты '
+        'подписок разными движками. Для fanout ленты должны быть собраны.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def measure(self, engine, user, params, repeat):
+        engine(user, params)
+        with CaptureQueriesContext(connection) as queries:
+            engine(user, params)
+        query_count = len(queries)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            list(engine(user, params))
+            reset_queries()
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        return elapsed, query_count
+
+    def handle(self, *args, username, repeat, **options):
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {username} не найден')
+        for name, engine in feeds.FEED_ENGINES.items():
+            first_page = engine(user, QueryDict())
+            pages = {'первая': QueryDict()}
+            if first_page.next_cursor:
+                pages['вторая'] = QueryDict(mutable=True)
+                pages['вторая']['after'] = first_page.next_cursor
+            for label, params in pages.items():
+                elapsed, queries = self.measure(engine, user, params, repeat)
+                self.stdout.write(
+                    f'{name:>7} {label:>7}: {elapsed:8.2f} мс, '
+                    f'запросов: {queries}'
+                )
@@ -0,0 +1,93 @@
+import io
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageOps
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from posts.models import Post
+from posts.thumbnails import FRAME_HEIGHT, FRAME_WIDTH, rendition_formats
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время кодирования и размер вариантов картинок '
+        '(POSTS_IMAGE_WIDTHS × POSTS_IMAGE_FORMATS) с единственной '
+        'миниатюрой JPEG 960x339.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Файлы картинок; по умолчанию — картинки последних постов.',
+        )
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def sources(self, paths, limit):
+        if paths:
+            return paths
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        )[:limit]
+        return [default_storage.path(name) for name in names]
+
+    def encode(self, image, width, image_format, quality, repeat):
+        """Среднее время кодирования в мс и размер в байтах."""
+        height = round(width * FRAME_HEIGHT / FRAME_WIDTH)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            frame = ImageOps.fit(image, (width, height), Image.LANCZOS)
+            data = io.BytesIO()
+            frame.save(
+                data, format=image_format, quality=quality, optimize=True
+            )
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        return elapsed, data.tell()
+
+    def handle(self, *args, paths, limit, repeat, **options):
+        images = []
+        for path in self.sources(paths, limit):
+            with Image.open(path) as image:
+                images.append(image.convert('RGB'))
+        if not images:
+            raise CommandError('Нет картинок: передайте пути к файлам.')
+        skipped = set(settings.POSTS_IMAGE_FORMATS) - set(rendition_formats())
+        if skipped:
+            self.stdout.write(
+                f'Не поддерживаются здесь: {", ".join(sorted(skipped))}'
+            )
+        variants = [
+            ('JPEG', FRAME_WIDTH, thumbnail_settings.THUMBNAIL_QUALITY)
+        ]
+        variants += [
+            (image_format, width, settings.POSTS_IMAGE_QUALITY)
+            for image_format in rendition_formats()
+            for width in settings.POSTS_IMAGE_WIDTHS
+        ]
+        results = []
+        for image_format, width, quality in variants:
+            timings = [
+                self.encode(image, width, image_format, quality, repeat)
+                for image in images
+            ]
+            results.append((
+                image_format, width, quality,
+                sum(ms for ms, _ in timings) / len(images),
+                sum(size for _, size in timings) / len(images),
+            ))
+        baseline = results[0][4]
+        self.stdout.write(
+            f'Картинок: {len(images)}. Первая строка — текущая миниатюра.'
+        )
+        self.stdout.write(
+            f'{"формат":>6} {"ширина":>6} {"кач.":>4} {"мс":>8} '
+            f'{"КБ":>8} {"от базы":>8}'
+        )
+        for image_format, width, quality, ms, size in results:
+            self.stdout.write(
+                f'{image_format:>6} {width:6} {quality:4} {ms:8.1f} '
+                f'{size / 1024:8.1f} {size / baseline:8.0%}'
+            )
@@ -0,0 +1,134 @@
+import itertools
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from posts import thumbnails
+from posts.models import ImageBlob, Post
+from posts.storage import post_images
+
+# Сколько имён уходит в один IN (...): у SQLite предел — 999.
+LOOKUP_CHUNK = 400
+TEMPORARY_PREFIX = '.upload-'
+
+
+def walk(path):
+    """Файлы каталога и подкаталогов по одному, без списка в памяти."""
+    try:
+        entries = os.scandir(path)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые не ссылается ни один пост, '
+        'вместе с их миниатюрами. Файлы моложе --min-age не трогаются: '
+        'их может сохранять запрос, который ещё не записал пост.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что и сколько места было бы освобождено.',
+        )
+        parser.add_argument(
+            '--min-age', type=float, default=24,
+            help='Минимальный возраст файла в часах.',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками в секундах, чтобы не нагружать диск.',
+        )
+
+    def handle(self, *args, dry_run, min_age, batch_size, pause, **options):
+        self.dry_run = dry_run
+        self.verbosity = options['verbosity']
+        self.cutoff = time.time() - min_age * 3600
+        self.files = self.reclaimed = 0
+        root = post_images.path('')
+        upload_to = Post._meta.get_field('image').upload_to
+        entries = walk(post_images.path(upload_to))
+        while True:
+            batch = list(itertools.islice(entries, batch_size))
+            if not batch:
+                break
+            names = {
+                os.path.relpath(entry.path, root).replace(os.sep, '/'): entry
+                for entry in batch if self.is_old(entry.path)
+            }
+            self.collect(names)
+            if pause:
+                time.sleep(pause)
+        action = 'Можно удалить' if dry_run else 'Удалено'
+        self.stdout.write(
+            f'{action} файлов: {self.files}, '
+            f'{filesizeformat(self.reclaimed)}'
+        )
+
+    def is_old(self, path):
+        try:
+            return os.stat(path).st_mtime < self.cutoff
+        except FileNotFoundError:
+            return False
+
+    def collect(self, names):
+        temporary = [
+            name for name in names
+            if os.path.basename(name).startswith(TEMPORARY_PREFIX)
+        ]
+        candidates = sorted(set(names) - set(temporary))
+        referenced = set()
+        for start in range(0, len(candidates), LOOKUP_CHUNK):
+            referenced.update(Post.objects.filter(
+                image__in=candidates[start:start + LOOKUP_CHUNK]
+            ).values_list('image', flat=True))
+        orphans = [name for name in candidates if name not in referenced]
+        # Брошенные недописанные загрузки: миниатюр у них нет.
+        for name in temporary:
+            self.remove(name, names[name].stat().st_size)
+        removed = []
+        for name in orphans:
+            # Сохранение поста с такой же картинкой обновляет дату файла
+            # до того, как пост попадёт в базу: проверяем дату ещё раз
+            # уже после запроса к базе.
+            if not self.is_old(post_images.path(name)):
+                continue
+            size = names[name].stat().st_size + self.thumbnails_size(name)
+            self.remove(name, size, with_thumbnails=True)
+            removed.append(name)
+        if removed and not self.dry_run:
+            for start in range(0, len(removed), LOOKUP_CHUNK):
+                ImageBlob.objects.filter(
+                    name__in=removed[start:start + LOOKUP_CHUNK]
+                ).delete()
+
+    def thumbnails_size(self, name):
+        size = 0
+        for thumbnail in thumbnails.thumbnail_files(name):
+            try:
+                size += thumbnail.storage.size(thumbnail.name)
+            except FileNotFoundError:
+                pass
+        return size
+
+    def remove(self, name, size, with_thumbnails=False):
+        self.files += 1
+        self.reclaimed += size
+        if self.verbosity > 1:
+            self.stdout.write(f'{name} ({filesizeformat(size)})')
+        if self.dry_run:
+            return
+        if with_thumbnails:
+            thumbnails.delete_with_thumbnails(name)
+        else:
+            post_images.delete(name)
@@ -0,0 +1,54 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exports import EXPORT_FORMATS, stream_export
+from posts.models import Group
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Выгружает все посты автора или группы в JSONL, CSV или ZIP.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--author', help='Имя пользователя.')
+        parser.add_argument('--group', help='slug группы.')
+        parser.add_argument(
+            '--format', dest='file_format', choices=list(EXPORT_FORMATS),
+            default='jsonl',
+        )
+        parser.add_argument(
+            '--comments', action='store_true',
+            help='Добавить комментарии к постам.',
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для выгрузки; по умолчанию — stdout.',
+        )
+
+    def handle(self, *args, author=None, group=None, file_format, comments,
+               output, **options):
+        if bool(author) == bool(group):
+            raise CommandError('Укажите ровно одно: --author или --group.')
+        if author:
+            owner = User.objects.filter(username=author).first()
+        else:
+            owner = Group.objects.filter(slug=group).first()
+        if owner is None:
+            raise CommandError(f'Не найден: {author or group}')
+        chunks = stream_export(owner.posts.all(), file_format, comments)
+        if output == '-':
+            self.write(sys.stdout.buffer, chunks)
+            return
+        with open(output, 'wb') as file:
+            size = self.write(file, chunks)
+        self.stderr.write(f'Записано {size} байт в {output}')
+
+    def write(self, file, chunks):
+        size = 0
+        for chunk in chunks:
+            file.write(chunk)
+            size += len(chunk)
+        return size
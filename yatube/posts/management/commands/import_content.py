@@ -0,0 +1,298 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import bump_generations
+from posts import feeds, search
+from posts.models import Follow, Group, ImportCheckpoint, Post, ProfileStats
+
+User = get_user_model()
+
+# Сколько значений уходит в один IN (...): у SQLite предел — 999.
+LOOKUP_CHUNK = 400
+
+
+def chunks(items, size=LOOKUP_CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает группы, посты и подписки из JSONL или CSV пачками. '
+        'У каждой записи есть поле type: group (slug, title, description), '
+        'post (author, text, group, pub_date) или follow (user, author). '
+        'Повторный запуск продолжает с последней сохранённой пачки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', dest='file_format', choices=('jsonl', 'csv'),
+            help='По умолчанию — по расширению файла.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать файл сначала, не глядя на сохранённый прогресс.',
+        )
+
+    def handle(self, *args, path, file_format=None, batch_size, restart,
+               **options):
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл не найден: {path}')
+        file_format = file_format or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+            source=os.path.abspath(path)
+        )
+        if restart:
+            checkpoint.offset = checkpoint.records = 0
+        elif checkpoint.records:
+            self.stdout.write(
+                f'Продолжение с записи {checkpoint.records + 1}'
+            )
+        self.verbosity = options['verbosity']
+        self.users = {}
+        self.groups = {group.slug: group for group in Group.objects.all()}
+        self.search = search.get_backend()
+        self.fan_out = feeds.feed_engine() == 'fanout'
+        self.started = time.monotonic()
+        self.imported = self.skipped = 0
+        batch = []
+        number, offset = checkpoint.records, checkpoint.offset
+        for record, offset in self.read(
+            path, file_format, checkpoint.offset
+        ):
+            number += 1
+            batch.append((number, record))
+            if len(batch) >= batch_size:
+                self.flush(batch, checkpoint, offset, number)
+                batch = []
+        self.flush(batch, checkpoint, offset, number)
+        self.stdout.write(
+            f'Загружено записей: {self.imported}, '
+            f'пропущено: {self.skipped} '
+            f'({self.rate():.0f} записей/с)'
+        )
+
+    def read(self, path, file_format, offset):
+        """Записи файла, начиная с offset, и смещение после каждой."""
+        with open(path, 'rb') as file:
+            if file_format == 'csv':
+                header = file.readline().decode('utf-8-sig')
+                fieldnames = next(csv.reader([header]), None)
+                offset = max(offset, file.tell())
+            file.seek(offset)
+            position = offset
+
+            def lines():
+                nonlocal position
+                for raw in file:
+                    position += len(raw)
+                    yield raw.decode('utf-8')
+
+            if file_format == 'csv':
+                for row in csv.DictReader(lines(), fieldnames=fieldnames):
+                    yield row, position
+                return
+            for line in lines():
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line), position
+                except ValueError:
+                    yield None, position
+
+    def rate(self):
+        return self.imported / max(time.monotonic() - self.started, 1e-6)
+
+    def skip(self, number, reason):
+        self.skipped += 1
+        self.stderr.write(f'Запись {number} пропущена: {reason}')
+
+    def flush(self, batch, checkpoint, offset, number):
+        """Сохраняет пачку и прогресс в одной транзакции."""
+        records = {kind: [] for kind in ('group', 'post', 'follow')}
+        for record_number, record in batch:
+            kind = record.get('type') if isinstance(record, dict) else None
+            if kind in records:
+                records[kind].append((record_number, record))
+            else:
+                self.skip(record_number, 'неизвестный тип записи')
+        tags = set()
+        with transaction.atomic():
+            self.save_groups(records['group'])
+            self.resolve_users(
+                [record.get('author') for _, record in records['post']]
+                + [
+                    record.get(field)
+                    for _, record in records['follow']
+                    for field in ('user', 'author')
+                ]
+            )
+            tags |= self.save_posts(records['post'])
+            tags |= self.save_follows(records['follow'])
+            checkpoint.offset = offset
+            checkpoint.records = number
+            checkpoint.save()
+        # bulk_create не шлёт сигналы: кэш сбрасываем сами, после коммита.
+        if tags:
+            bump_generations('feed:index', *tags)
+        if batch and self.verbosity:
+            self.stdout.write(
+                f'Записей: {number}, {self.rate():.0f} записей/с'
+            )
+
+    def save_groups(self, records):
+        new = {}
+        for number, record in records:
+            slug = record.get('slug')
+            if not slug or not record.get('title'):
+                self.skip(number, 'у группы нет slug или title')
+                continue
+            self.imported += 1
+            if slug not in self.groups:
+                new[slug] = Group(
+                    slug=slug,
+                    title=record['title'],
+                    description=record.get('description') or '',
+                )
+        Group.objects.bulk_create(new.values(), ignore_conflicts=True)
+        for slugs in chunks(new):
+            for group in Group.objects.filter(slug__in=slugs):
+                self.groups[group.slug] = group
+
+    def resolve_users(self, usernames):
+        """Дополняет карту имя -> id, заводя недостающих пользователей."""
+        missing = {name for name in usernames if name} - set(self.users)
+        for names in chunks(missing):
+            self.users.update(User.objects.filter(
+                username__in=names
+            ).values_list('username', 'pk'))
+        missing -= set(self.users)
+        User.objects.bulk_create(
+            [
+                User(username=name, password=make_password(None))
+                for name in missing
+            ],
+            ignore_conflicts=True,
+        )
+        created = {}
+        for names in chunks(missing):
+            created.update(User.objects.filter(
+                username__in=names
+            ).values_list('username', 'pk'))
+        self.users.update(created)
+        # bulk_create не шлёт post_save: счётчики заводим сами.
+        ProfileStats.objects.bulk_create(
+            [ProfileStats(user_id=pk) for pk in created.values()],
+            ignore_conflicts=True,
+        )
+
+    def build_post(self, number, record):
+        author_id = self.users.get(record.get('author'))
+        if author_id is None or not record.get('text'):
+            self.skip(number, 'у поста нет автора или текста')
+            return None
+        group = None
+        if record.get('group'):
+            group = self.groups.get(record['group'])
+            if group is None:
+                self.skip(number, f'нет группы {record["group"]}')
+                return None
+        pub_date = timezone.now()
+        if record.get('pub_date'):
+            pub_date = parse_datetime(record['pub_date'])
+            if pub_date is None:
+                self.skip(number, 'не разобрана дата')
+                return None
+            if timezone.is_naive(pub_date):
+                pub_date = timezone.make_aware(pub_date)
+        return Post(
+            text=record['text'],
+            author_id=author_id,
+            group=group,
+            pub_date=pub_date,
+        )
+
+    def save_posts(self, records):
+        posts = [self.build_post(number, record) for number, record in records]
+        posts = [post for post in posts if post is not None]
+        if not posts:
+            return set()
+        last_pk = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        # auto_now_add в bulk_create перезаписывает pub_date текущим
+        # временем: даты из файла возвращаем отдельным запросом.
+        pub_dates = [post.pub_date for post in posts]
+        Post.objects.bulk_create(posts)
+        if not connection.features.can_return_ids_from_bulk_insert:
+            pks = list(Post.objects.filter(
+                pk__gt=last_pk
+            ).order_by('pk').values_list('pk', flat=True))
+            if len(pks) != len(posts):
+                raise CommandError(
+                    'Во время импорта посты добавлялись параллельно.'
+                )
+            for post, pk in zip(posts, pks):
+                post.pk = pk
+        for post, pub_date in zip(posts, pub_dates):
+            post.pub_date = pub_date
+        Post.objects.bulk_update(posts, ['pub_date'])
+        self.imported += len(posts)
+        self.search.index_posts(posts)
+        if self.fan_out:
+            feeds.fan_out_posts(posts)
+        authors = Counter(post.author_id for post in posts)
+        for author_id, count in authors.items():
+            ProfileStats.increment(author_id, 'posts_count', count)
+            feeds.invalidate_recent_posts(author_id)
+        return {f'author:{author_id}' for author_id in authors} | {
+            f'group:{post.group.slug}' for post in posts if post.group_id
+        }
+
+    def save_follows(self, records):
+        pairs = {}
+        for number, record in records:
+            user_id = self.users.get(record.get('user'))
+            author_id = self.users.get(record.get('author'))
+            if user_id is None or author_id is None or user_id == author_id:
+                self.skip(number, 'подписка без пользователей или на себя')
+                continue
+            self.imported += 1
+            pairs[user_id, author_id] = Follow(
+                user_id=user_id, author_id=author_id
+            )
+        for chunk in chunks(pairs):
+            existing = Follow.objects.filter(
+                user_id__in={user_id for user_id, _ in chunk},
+                author_id__in={author_id for _, author_id in chunk},
+            ).values_list('user_id', 'author_id')
+            for pair in existing:
+                pairs.pop(pair, None)
+        Follow.objects.bulk_create(pairs.values(), ignore_conflicts=True)
+        following = Counter(user_id for user_id, _ in pairs)
+        followers = Counter(author_id for _, author_id in pairs)
+        for user_id, count in following.items():
+            ProfileStats.increment(user_id, 'following_count', count)
+        for author_id, count in followers.items():
+            ProfileStats.increment(author_id, 'followers_count', count)
+        if self.fan_out:
+            for user_id, author_id in pairs:
+                feeds.backfill_follow(user_id, author_id)
+        return {f'feed:follow:{user_id}' for user_id in following} | {
+            f'author:{user_id}' for user_id in following | followers
+        }
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import feeds
+from posts.models import FeedEntry, Follow
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', dest='username',
+            help='Пересобрать ленту только этого пользователя.',
+        )
+
+    def handle(self, *args, username=None, **options):
+        if username:
+            users = User.objects.filter(username=username)
+        else:
+            FeedEntry.objects.exclude(
+                user_id__in=Follow.objects.values('user_id')
+            ).delete()
+            users = User.objects.filter(follower__isnull=False).distinct()
+        rebuilt = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            with transaction.atomic():
+                FeedEntry.objects.filter(user_id=user_id).delete()
+                authors = Follow.objects.filter(
+                    user_id=user_id
+                ).values_list('author_id', flat=True)
+                for author_id in authors:
+                    feeds.backfill_follow(user_id, author_id)
+            rebuilt += 1
+        self.stdout.write(f'Пересобрано лент: {rebuilt}')
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import ProfileStats
+
+User = get_user_model()
+# Сколько значений уходит в один IN (...): у SQLite предел — 999.
+LOOKUP_CHUNK = 400
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и подписок пачками пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=LOOKUP_CHUNK,
+            help=f'Пользователей за раз, не больше {LOOKUP_CHUNK}.',
+        )
+
+    def reconcile(self, user_ids):
+        with transaction.atomic():
+            existing = ProfileStats.objects.select_for_update().in_bulk(
+                user_ids
+            )
+            fresh = ProfileStats.recount(user_ids)
+            ProfileStats.objects.bulk_update(
+                [stats for stats in fresh if stats.user_id in existing],
+                ['posts_count', 'followers_count', 'following_count'],
+            )
+            ProfileStats.objects.bulk_create(
+                [stats for stats in fresh if stats.user_id not in existing]
+            )
+
+    def handle(self, *args, chunk_size, **options):
+        chunk_size = max(1, min(chunk_size, LOOKUP_CHUNK))
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        last_id = 0
+        total = 0
+        while True:
+            chunk = list(user_ids.filter(pk__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            self.reconcile(chunk)
+            last_id = chunk[-1]
+            total += len(chunk)
+        self.stdout.write(f'Пересчитано пользователей: {total}')
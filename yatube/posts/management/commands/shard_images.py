@@ -0,0 +1,128 @@
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.cache import bump_generations, post_tags
+from posts import thumbnails
+from posts.models import ImageBlob, Post
+from posts.storage import SHARDED_NAME_RE, post_images
+
+HASH_NAME = re.compile(r'^[0-9a-f]{64}$')
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в подкаталоги по хешу содержимого '
+        '(posts/ab/cd/<hash>.jpg) и переписывает Post.image пачками. '
+        'Сайт продолжает работать: файл сначала появляется по новому '
+        'пути, затем меняются ссылки, и только потом удаляется старый. '
+        'Прерванный перенос можно просто запустить снова.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками в секундах, чтобы не нагружать диск.',
+        )
+
+    def handle(self, *args, batch_size, pause, **options):
+        self.moved = self.missing = 0
+        posts = Post.objects.exclude(image='').exclude(
+            image__regex=SHARDED_NAME_RE
+        ).order_by('pk')
+        last_pk = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk).values_list(
+                'pk', 'image'
+            )[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            names = defaultdict(list)
+            for pk, name in batch:
+                names[name].append(pk)
+            for name in names:
+                self.move(name)
+            self.stdout.write(f'Обработано постов до id {last_pk}')
+            if pause:
+                time.sleep(pause)
+        self.stdout.write(
+            f'Перенесено файлов: {self.moved}, '
+            f'не найдено на диске: {self.missing}'
+        )
+
+    def target_name(self, name):
+        directory, basename = posixpath.split(name)
+        stem, extension = os.path.splitext(basename)
+        # Файлы, сохранённые ContentAddressedStorage, уже названы хешем;
+        # старые загрузки приходится прочитать.
+        digest = stem if HASH_NAME.match(stem) else post_images.digest(name)
+        return post_images.content_name(
+            directory, digest, extension.lower()
+        )
+
+    def place(self, source, target):
+        """Делает файл доступным по новому пути, не трогая старый."""
+        if os.path.exists(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(source, target)
+        except OSError:
+            # Жёсткие ссылки не везде доступны: копируем через временный
+            # файл, чтобы по новому пути не оказался недописанный.
+            descriptor, temporary = tempfile.mkstemp(
+                dir=os.path.dirname(target), prefix='.upload-'
+            )
+            os.close(descriptor)
+            try:
+                shutil.copyfile(source, temporary)
+                os.replace(temporary, target)
+            except BaseException:
+                os.remove(temporary)
+                raise
+
+    def move(self, name):
+        if not post_images.exists(name):
+            self.missing += 1
+            self.stderr.write(f'Нет файла: {name}')
+            return
+        target = self.target_name(name)
+        self.place(post_images.path(name), post_images.path(target))
+        with transaction.atomic():
+            referencing = Post.objects.select_for_update().filter(image=name)
+            moved = list(referencing.select_related('group').only(
+                'pk', 'author_id', 'group__slug'
+            ))
+            # update() не шлёт сигналы: счётчик ссылок переносим сами.
+            referencing.update(image=target)
+            ImageBlob.objects.filter(name=name).delete()
+            ImageBlob.objects.update_or_create(
+                name=target,
+                defaults={
+                    'refcount': Post.objects.filter(image=target).count(),
+                },
+            )
+        # Разметка с новым путём должна дойти до всех страниц с этими
+        # постами, иначе браузеры получат 304 на старые.
+        bump_generations('feed:index', *post_tags(moved))
+        # Миниатюры sorl привязаны к имени файла: строим их заранее,
+        # чтобы страницы не делали этого при показе.
+        for post in moved:
+            try:
+                thumbnails.generate_thumbnails(post.pk)
+            except Exception as error:
+                self.stderr.write(f'Миниатюры поста {post.pk}: {error}')
+        if not Post.objects.filter(image=name).exists():
+            # Миниатюры старого файла clean_media уже не найдёт: у постов
+            # его имени нет.
+            thumbnails.delete_with_thumbnails(name)
+        self.moved += 1
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0008_auto_20261018_0621'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики пользователя',
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+    ]
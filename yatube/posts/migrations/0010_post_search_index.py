@@ -0,0 +1,35 @@
+from django.db import migrations
+
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts "
+    "USING fts5(text, group_title, tokenize='unicode61')"
+)
+FILL_TABLE = (
+    "INSERT INTO posts_post_fts (rowid, text, group_title) "
+    "SELECT posts_post.id, posts_post.text, COALESCE(posts_group.title, '') "
+    "FROM posts_post "
+    "LEFT JOIN posts_group ON posts_group.id = posts_post.group_id"
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    schema_editor.execute(FILL_TABLE)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_profilestats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
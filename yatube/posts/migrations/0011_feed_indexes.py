@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:34
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    duplicates = (
+        Follow.objects.values('user_id', 'author_id')
+        .annotate(first_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for duplicate in duplicates:
+        Follow.objects.filter(
+            user_id=duplicate['user_id'], author_id=duplicate['author_id']
+        ).exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_pub_date_idx'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_comment_page_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='Смещение в байтах')),
+                ('records', models.BigIntegerField(default=0, verbose_name='Записей')),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Прогресс импорта',
+                'verbose_name_plural': 'Прогресс импорта',
+            },
+        ),
+    ]
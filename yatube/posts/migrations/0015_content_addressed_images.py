@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:50
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def count_image_references(apps, schema_editor):
+    # Уже загруженные файлы сохраняют старые имена; считаем ссылки на них,
+    # чтобы сборщик мусора не принял их за брошенные.
+    Post = apps.get_model('posts', 'Post')
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    references = (
+        Post.objects.exclude(image='').order_by()
+        .values('image').annotate(total=Count('id'))
+    )
+    ImageBlob.objects.bulk_create(
+        (
+            ImageBlob(name=row['image'], refcount=row['total'])
+            for row in references.iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(
+            count_image_references, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+    ]
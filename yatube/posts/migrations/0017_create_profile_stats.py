@@ -0,0 +1,59 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+
+# Сколько значений уходит в один IN (...): у SQLite предел — 999.
+CHUNK = 400
+
+
+# Намеренно замороженная копия подсчёта из ProfileStats.recount:
+# миграция должна работать с моделями из apps, а не с текущим кодом.
+def _counts(queryset, field, user_ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': user_ids})
+        .order_by()
+        .values_list(field)
+        .annotate(total=Count('pk'))
+    )
+
+
+def create_profile_stats(apps, schema_editor):
+    # Дальше записи заводит сигнал post_save пользователя, а счётчики
+    # только меняются на дельту.
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    ProfileStats = apps.get_model('posts', 'ProfileStats')
+    user_ids = list(User.objects.filter(
+        stats__isnull=True
+    ).order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(user_ids), CHUNK):
+        chunk = user_ids[start:start + CHUNK]
+        posts = _counts(Post.objects, 'author_id', chunk)
+        followers = _counts(Follow.objects, 'author_id', chunk)
+        following = _counts(Follow.objects, 'user_id', chunk)
+        ProfileStats.objects.bulk_create([
+            ProfileStats(
+                user_id=user_id,
+                posts_count=posts.get(user_id, 0),
+                followers_count=followers.get(user_id, 0),
+                following_count=following.get(user_id, 0),
+            )
+            for user_id in chunk
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0016_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_profile_stats, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:40
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_feed_entries(apps, schema_editor):
+    # Подписки, оформленные до появления FeedEntry: без этого лента
+    # подписок пуста, пока кто-нибудь не запустит rebuild_feeds.
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    follows = Follow.objects.order_by('pk').values_list('user_id', 'author_id')
+    batch = []
+    for user_id, author_id in follows.iterator():
+        posts = Post.objects.filter(
+            author_id=author_id
+        ).values_list('pk', 'pub_date')
+        for post_id, pub_date in posts.iterator():
+            batch.append(FeedEntry(
+                user_id=user_id, post_id=post_id, pub_date=pub_date
+            ))
+            if len(batch) >= BATCH_SIZE:
+                FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_create_profile_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_feed_entries, migrations.RunPython.noop
+        ),
+    ]
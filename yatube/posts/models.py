@@ -1,6 +1,10 @@
+import json
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import post_images
+
 User = get_user_model()
 
 
@@ -41,17 +45,45 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_images,
         blank=True
     )
+    # Размеры и заглушка заполняются при загрузке (posts.images), чтобы
+    # не открывать файл ради них. width_field здесь не подходит: Django
+    # читал бы картинку при создании каждого объекта с пустыми размерами.
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False)
+    # JSON [[mime-тип, srcset], ...] из posts.thumbnails.build_renditions.
+    image_renditions = models.TextField(blank=True, editable=False)
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def image_sources(self):
+        """Пары (mime-тип, srcset) для <source> внутри <picture>."""
+        try:
+            return json.loads(self.image_renditions)
+        except ValueError:
+            # Пусто, пока варианты не построены.
+            return []
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -76,6 +108,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_id_idx',
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -96,4 +134,148 @@ class Follow(models.Model):
                 name='prevent_self_follow',
                 check=~models.Q(user=models.F('author')),
             ),
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date', '-post')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry',
+            ),
+        ]
+
+
+def _counts(queryset, field, user_ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': user_ids})
+        .order_by()
+        .values_list(field)
+        .annotate(total=models.Count('pk'))
+    )
+
+
+class ProfileStats(models.Model):
+    """Счётчики постов и подписок пользователя без COUNT(*) при чтении."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    @classmethod
+    def for_user(cls, user):
+        """Счётчики пользователя.
+
+        Запись заводится вместе с пользователем (сигнал post_save
+        и миграция для прежних), так что её остаётся только прочитать.
+        """
+        stats, _ = cls.objects.get_or_create(user=user)
+        return stats
+
+    @classmethod
+    def recount(cls, user_ids):
+        """Несохранённые счётчики пользователей, посчитанные заново.
+
+        Все user_ids уходят в один IN (...), так что звать пачками.
+        """
+        posts = _counts(Post.objects, 'author_id', user_ids)
+        followers = _counts(Follow.objects, 'author_id', user_ids)
+        following = _counts(Follow.objects, 'user_id', user_ids)
+        return [
+            cls(
+                user_id=user_id,
+                posts_count=posts.get(user_id, 0),
+                followers_count=followers.get(user_id, 0),
+                following_count=following.get(user_id, 0),
+            )
+            for user_id in user_ids
         ]
+
+    @classmethod
+    def increment(cls, user_id, field, delta):
+        """Атомарно меняет счётчик."""
+        stats = cls.objects.filter(user_id=user_id)
+        if delta < 0:
+            stats = stats.filter(**{f'{field}__gte': -delta})
+        stats.update(
+            **{field: models.F(field) + delta}
+        )
+
+
+class ImportCheckpoint(models.Model):
+    """Докуда загружен файл командой import_content."""
+    source = models.CharField('Файл', max_length=255, unique=True)
+    offset = models.BigIntegerField('Смещение в байтах', default=0)
+    records = models.BigIntegerField('Записей', default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Прогресс импорта'
+        verbose_name_plural = 'Прогресс импорта'
+
+    def __str__(self):
+        return f'{self.source}: {self.records}'
+
+
+class ImageBlob(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+    name = models.CharField('Файл', max_length=255, unique=True)
+    refcount = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return f'{self.name}: {self.refcount}'
+
+    @classmethod
+    def acquire(cls, name):
+        blob, created = cls.objects.get_or_create(
+            name=name, defaults={'refcount': 1}
+        )
+        if not created:
+            cls.objects.filter(pk=blob.pk).update(
+                refcount=models.F('refcount') + 1
+            )
+
+    @classmethod
+    def release(cls, name):
+        """Снимает ссылку; файл без ссылок удалит сборщик мусора."""
+        cls.objects.filter(name=name, refcount__gt=0).update(
+            refcount=models.F('refcount') - 1
+        )
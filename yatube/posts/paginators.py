@@ -0,0 +1,126 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+POST_IN_PAGE = 10
+FEED_ORDERING = ('-pub_date', '-id')
+# Целое больше BIGINT драйвер базы не передаст: OverflowError.
+MAX_BIGINT = 2 ** 63 - 1
+
+
+def fits_bigint(value):
+    """Можно ли передать значение из курсора в запрос."""
+    return not isinstance(value, int) or -MAX_BIGINT - 1 <= value <= MAX_BIGINT
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу сортировки вместо COUNT(*) и OFFSET.
+
+    Страница выбирается условием «строго после/до курсора» по полям
+    ordering, поэтому любая страница стоит столько же, сколько первая.
+    Курсор — непрозрачная строка с значениями этих полей у крайней записи.
+    Записями могут быть и словари из values(), если в них есть эти поля.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING):
+        super().__init__(object_list.order_by(*ordering), per_page)
+        self.ordering = ordering
+        self.model = object_list.model
+
+    def _fields(self):
+        return [
+            (field.lstrip('-'), field.startswith('-'))
+            for field in self.ordering
+        ]
+
+    def encode_cursor(self, obj):
+        values = []
+        for name, _ in self._fields():
+            value = obj[name] if isinstance(obj, dict) else getattr(obj, name)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+    def decode_cursor(self, token):
+        """Возвращает значения полей курсора или None, если он испорчен."""
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            values = json.loads(raw.decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        fields = self._fields()
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        try:
+            values = [
+                self.model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(fields, values)
+            ]
+        except (ValidationError, TypeError, OverflowError):
+            return None
+        return values if all(map(fits_bigint, values)) else None
+
+    def _seek(self, values, forward):
+        """Условие «после курсора» в направлении сортировки (или обратном)."""
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self._fields(), values):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def get_cursor_page(self, after=None, before=None):
+        """Страница после курсора after, до курсора before или первая."""
+        after = after and self.decode_cursor(after)
+        before = before and self.decode_cursor(before)
+        queryset = self.object_list
+        if before:
+            reverse = [
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in self.ordering
+            ]
+            queryset = queryset.filter(self._seek(before, forward=False))
+            items = list(queryset.order_by(*reverse)[:self.per_page + 1])
+            has_previous = len(items) > self.per_page
+            items = items[:self.per_page][::-1]
+            has_next = True
+        else:
+            if after:
+                queryset = queryset.filter(self._seek(after, forward=True))
+            items = list(queryset[:self.per_page + 1])
+            has_next = len(items) > self.per_page
+            items = items[:self.per_page]
+            has_previous = bool(after)
+        return self.make_page(items, has_next, has_previous)
+
+    def make_page(self, items, has_next, has_previous):
+        """Страница из готовых записей с курсорами на соседние."""
+        page = self._get_page(items, 1, self)
+        page.next_cursor = (
+            self.encode_cursor(items[-1]) if has_next and items else None
+        )
+        page.previous_cursor = (
+            self.encode_cursor(items[0]) if has_previous and items else None
+        )
+        return page
+
+
+def paginate(params, queryset, ordering=FEED_ORDERING):
+    """Страница ленты по ?after=/?before=, а для ?page= — по номеру."""
+    if 'page' in params:
+        paginator = Paginator(queryset.order_by(*ordering), POST_IN_PAGE)
+        return paginator.get_page(params.get('page'))
+    paginator = CursorPaginator(queryset, POST_IN_PAGE, ordering)
+    return paginator.get_cursor_page(
+        after=params.get('after'),
+        before=params.get('before'),
+    )
@@ -0,0 +1,177 @@
+import base64
+import binascii
+import json
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .paginators import fits_bigint
+
+SEARCH_TABLE = 'posts_post_fts'
+TOKEN_RE = re.compile(r'\w+')
+
+
+def encode_cursor(score, post_id):
+    raw = json.dumps([score, post_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(token):
+    """(score, id) из курсора или None, если он испорчен."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        score, post_id = json.loads(raw.decode())
+        score, post_id = float(score), int(post_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError,
+            OverflowError):
+        return None
+    return (score, post_id) if fits_bigint(post_id) else None
+
+
+class FallbackSearchBackend:
+    """Поиск через icontains для баз без полнотекстового индекса.
+
+    Индекс не ведёт; все совпадения имеют одинаковый ранг,
+    порядок — от новых постов к старым.
+    """
+
+    def index_post(self, post):
+        self.index_posts([post])
+
+    def index_posts(self, posts):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def index_group(self, group_id, title):
+        pass
+
+    def _filter(self, query):
+        condition = Q()
+        for token in TOKEN_RE.findall(query):
+            condition &= (
+                Q(text__icontains=token) | Q(group__title__icontains=token)
+            )
+        return condition
+
+    def matching(self, query):
+        """Значение для pk__in: id всех постов, подходящих под запрос."""
+        if not TOKEN_RE.search(query):
+            return []
+        return Post.objects.filter(self._filter(query)).values('pk')
+
+    def search(self, query, after=None, limit=10):
+        """Список (ранг, id) по возрастанию ранга, затем по убыванию id."""
+        if not TOKEN_RE.search(query):
+            return []
+        posts = Post.objects.filter(self._filter(query)).order_by('-pk')
+        if after:
+            posts = posts.filter(pk__lt=after[1])
+        return [(0.0, pk) for pk in posts.values_list('pk', flat=True)[
+            :limit
+        ]]
+
+
+class SQLiteFTSBackend(FallbackSearchBackend):
+    """Инвертированный индекс FTS5 по тексту поста и названию группы.
+
+    Таблица posts_post_fts создаётся миграцией; rowid совпадает с id поста.
+    Ранг — bm25: чем меньше, тем релевантнее.
+    """
+
+    def _match(self, query):
+        # Каждое слово запроса — префиксный поиск в кавычках, чтобы
+        # пользовательский ввод не разбирался как синтаксис FTS5.
+        return ' '.join(
+            f'"{token}"*' for token in TOKEN_RE.findall(query)
+        )
+
+    def index_posts(self, posts):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                [[post.pk] for post in posts],
+            )
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, text, group_title) '
+                'VALUES (%s, %s, %s)',
+                [
+                    [post.pk, post.text,
+                     post.group.title if post.group_id else '']
+                    for post in posts
+                ],
+            )
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    def index_group(self, group_id, title):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {SEARCH_TABLE} SET group_title = %s '
+                'WHERE rowid IN (SELECT id FROM posts_post '
+                'WHERE group_id = %s)',
+                [title, group_id],
+            )
+
+    def matching(self, query):
+        match = self._match(query)
+        if not match:
+            return []
+        return RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s',
+            [match],
+        )
+
+    def search(self, query, after=None, limit=10):
+        match = self._match(query)
+        if not match:
+            return []
+        sql = (
+            'SELECT score, id FROM ('
+            f'SELECT bm25({SEARCH_TABLE}) AS score, rowid AS id '
+            f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s)'
+        )
+        params = [match]
+        if after:
+            sql += ' WHERE score > %s OR (score = %s AND id < %s)'
+            params += [after[0], after[0], after[1]]
+        sql += ' ORDER BY score, id DESC LIMIT %s'
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            return cursor.fetchall()
+
+
+def get_backend():
+    default = (
+        'posts.search.SQLiteFTSBackend' if connection.vendor == 'sqlite'
+        else 'posts.search.FallbackSearchBackend'
+    )
+    return import_string(
+        getattr(settings, 'POSTS_SEARCH_BACKEND', default)
+    )()
+
+
+def search_page(query, after=None, per_page=10):
+    """Посты страницы результатов и курсор следующей страницы."""
+    hits = get_backend().search(
+        query, after=after and decode_cursor(after), limit=per_page + 1
+    )
+    next_cursor = (
+        encode_cursor(*hits[per_page - 1]) if len(hits) > per_page else None
+    )
+    hits = hits[:per_page]
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [post_id for _, post_id in hits]
+    )
+    return [posts[pk] for _, pk in hits if pk in posts], next_cursor
@@ -0,0 +1,179 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from core.cache import bump_generations, post_tags
+
+from . import comments, feeds, search
+from .models import Comment, Follow, Group, ImageBlob, Post, ProfileStats
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    bump_generations('feed:index', *post_tags([instance]))
+    feeds.invalidate_recent_posts(instance.author_id)
+    if raw:
+        return
+    search.get_backend().index_post(instance)
+    if not created:
+        return
+    ProfileStats.increment(instance.author_id, 'posts_count', 1)
+    if feeds.feed_engine() == 'fanout':
+        feeds.fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_generations('feed:index', *post_tags([instance]))
+    search.get_backend().remove_post(instance.pk)
+    feeds.invalidate_recent_posts(instance.author_id)
+    ProfileStats.increment(instance.author_id, 'posts_count', -1)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Имя прежней картинки нужно, чтобы снять с неё ссылку после save.
+    instance._previous_image = None
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and 'image' not in update_fields:
+        instance._previous_image = instance.image.name or None
+        return
+    instance._previous_image = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_image', None)
+    current = instance.image.name or None
+    if raw or previous == current:
+        return
+    if current:
+        ImageBlob.acquire(current)
+    if previous:
+        ImageBlob.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def post_image_deleted(sender, instance, **kwargs):
+    if instance.image:
+        ImageBlob.release(instance.image.name)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    bump_generations(
+        f'feed:follow:{instance.user_id}',
+        f'author:{instance.user_id}',
+        f'author:{instance.author_id}',
+    )
+    if not created or raw:
+        return
+    ProfileStats.increment(instance.author_id, 'followers_count', 1)
+    ProfileStats.increment(instance.user_id, 'following_count', 1)
+    if feeds.feed_engine() == 'fanout':
+        feeds.backfill_follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump_generations(
+        f'feed:follow:{instance.user_id}',
+        f'author:{instance.user_id}',
+        f'author:{instance.author_id}',
+    )
+    ProfileStats.increment(instance.author_id, 'followers_count', -1)
+    ProfileStats.increment(instance.user_id, 'following_count', -1)
+    feeds.prune_follow(instance.user_id, instance.author_id)
+
+
+def group_author_tags(group):
+    """Теги профилей авторов, чьи посты показывают название группы."""
+    author_ids = getattr(group, '_author_ids', None)
+    if author_ids is None:
+        author_ids = Post.objects.filter(group=group).order_by().values_list(
+            'author_id', flat=True
+        ).distinct()
+    return {f'author:{author_id}' for author_id in author_ids}
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump_generations(
+        'feed:index', f'group:{instance.slug}', *group_author_tags(instance)
+    )
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.get_backend().index_group(instance.pk, instance.title)
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # После удаления у постов уже не будет group_id, по которому их искать.
+    search.get_backend().index_group(instance.pk, '')
+    instance._author_ids = list(Post.objects.filter(
+        group=instance
+    ).order_by().values_list('author_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    bump_generations(f'post:{instance.post_id}')
+    if created:
+        comments.adjust_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump_generations(f'post:{instance.post_id}')
+    comments.adjust_comments_count(instance.post_id, -1)
+
+
+# Поля пользователя, которые видны на страницах с его постами.
+DISPLAYED_USER_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Смена пароля или last_login страниц не меняет: сбрасывать их
+    # нужно, только если меняется показываемое имя.
+    instance._display_changed = False
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and not (
+        set(update_fields) & set(DISPLAYED_USER_FIELDS)
+    ):
+        return
+    previous = User.objects.filter(pk=instance.pk).values_list(
+        *DISPLAYED_USER_FIELDS
+    ).first()
+    instance._display_changed = previous != tuple(
+        getattr(instance, field) for field in DISPLAYED_USER_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        ProfileStats.objects.get_or_create(user=instance)
+        return
+    if not getattr(instance, '_display_changed', False):
+        return
+    # Имя автора показывается в его профиле, на страницах его постов
+    # и групп, где он писал.
+    groups = Group.objects.filter(
+        posts__author=instance
+    ).order_by().values_list('slug', flat=True).distinct()
+    bump_generations(
+        f'author:{instance.pk}', *(f'group:{slug}' for slug in groups)
+    )
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Файлы раскладываются по подкаталогам из первых символов хеша:
+# posts/ab/cd/abcd….jpg. Двух уровней по 256 каталогов хватает, чтобы
+# и при миллионах файлов в каталоге их оставалось немного.
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+# Регулярное выражение для имён, уже разложенных по подкаталогам
+# (годится и для lookup __regex).
+SHARDED_NAME_RE = (
+    r'/' + r'[0-9a-f]{%d}/' % SHARD_WIDTH * SHARD_LEVELS
+    + r'[0-9a-f]{64}(\.[^/]*)?$'
+)
+HASH_CHUNK = 64 * 1024
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы называются по SHA-256 содержимого.
+
+    Одинаковые загрузки хранятся одной копией, поэтому и миниатюры
+    sorl-thumbnail для них строятся один раз. Из имени, которое дал
+    upload_to, берутся только каталог и расширение; внутри каталога
+    файл попадает в подкаталоги по первым символам хеша. Сколько
+    постов ссылается на файл, считает posts.models.ImageBlob.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Настоящее имя выбирает _save по содержимому; совпадение
+        # имён означает тот же файл, а не конфликт.
+        return name
+
+    def content_name(self, directory, digest, extension):
+        shards = [
+            digest[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH]
+            for level in range(SHARD_LEVELS)
+        ]
+        return posixpath.join(directory, *shards, digest + extension)
+
+    def digest(self, name):
+        """SHA-256 уже сохранённого файла."""
+        digest = hashlib.sha256()
+        with self.open(name, 'rb') as file:
+            for chunk in file.chunks(HASH_CHUNK):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _save(self, name, content):
+        directory, basename = posixpath.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        upload_directory = self.path(directory)
+        os.makedirs(upload_directory, exist_ok=True)
+        # Хеш считается на лету, пока файл пишется во временный рядом
+        # с целевым: после записи остаётся только переименовать.
+        digest = hashlib.sha256()
+        descriptor, temporary = tempfile.mkstemp(
+            dir=upload_directory, prefix='.upload-'
+        )
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+            name = self.content_name(
+                directory, digest.hexdigest(), extension
+            )
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temporary)
+                # Свежая дата защищает файл от сборщика мусора,
+                # пока новая ссылка на него не сохранена.
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temporary, path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
+
+
+post_images = ContentAddressedStorage()
@@ -0,0 +1,393 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from core.cache import get_generations
+
+from .. import thumbnails
+from ..management.commands import reconcile_stats
+from ..management.commands.import_content import Command as ImportCommand
+from ..models import (FeedEntry, Follow, Group, ImageBlob, Post,
+                      ProfileStats)
+from ..search import get_backend
+from ..storage import post_images
+from .test_views import SMALL_GIF
+
+User = get_user_model()
+
+
+class RebuildFeedsCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.posts = [
+            Post.objects.create(text=f'Пост {index}', author=cls.author)
+            for index in range(3)
+        ]
+
+    def test_rebuild_restores_feed(self):
+        """Команда восстанавливает ленту подписчика по подпискам."""
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(
+            set(FeedEntry.objects.filter(
+                user=self.user
+            ).values_list('post_id', flat=True)),
+            {post.pk for post in self.posts}
+        )
+
+    def test_benchmark_feeds_reports_every_engine(self):
+        out = StringIO()
+        call_command('benchmark_feeds', 'reader', repeat=1, stdout=out)
+        for engine in ('join', 'fanout', 'pull'):
+            self.assertIn(engine, out.getvalue())
+
+
+class ReconcileStatsCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        Post.objects.create(text='Пост', author=cls.author)
+
+    def test_reconcile_recomputes_counters(self):
+        """Команда исправляет разошедшиеся счётчики."""
+        ProfileStats.objects.filter(user=self.author).update(posts_count=42)
+        call_command('reconcile_stats', chunk_size=1, stdout=StringIO())
+        stats = ProfileStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.user).following_count, 1
+        )
+
+    @mock.patch.object(reconcile_stats, 'LOOKUP_CHUNK', 1)
+    def test_chunk_size_clamped(self):
+        """Пачка не больше LOOKUP_CHUNK, что бы ни передали."""
+        ProfileStats.objects.filter(user=self.author).update(posts_count=42)
+        with CaptureQueriesContext(connection) as queries:
+            call_command(
+                'reconcile_stats', chunk_size=5000, stdout=StringIO()
+            )
+        post_counts = [
+            query for query in queries.captured_queries
+            if 'GROUP BY "posts_post"."author_id"' in query['sql']
+        ]
+        self.assertEqual(len(post_counts), User.objects.count())
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.author).posts_count, 1
+        )
+
+
+class ImportContentCommandTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_jsonl(self, name, records):
+        path = os.path.join(self.directory, name)
+        with open(path, 'a', encoding='utf-8') as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return path
+
+    def run_import(self, path, **options):
+        call_command(
+            'import_content', path, stdout=StringIO(), stderr=StringIO(),
+            **options
+        )
+
+    def test_import_jsonl(self):
+        """Группы, посты и подписки загружаются со всеми побочными
+        эффектами сигналов: поиском, лентами и счётчиками."""
+        path = self.write_jsonl('dump.jsonl', [
+            {'type': 'group', 'slug': 'cats', 'title': 'Кошки'},
+            {'type': 'follow', 'user': 'reader', 'author': 'author'},
+            {'type': 'post', 'author': 'author', 'text': 'Про котов',
+             'group': 'cats', 'pub_date': '2020-01-02T03:04:05'},
+            {'type': 'post', 'author': 'newcomer', 'text': 'Привет'},
+            {'type': 'post', 'author': 'author', 'text': 'Без группы',
+             'group': 'missing'},
+            {'type': 'unknown'},
+        ])
+        self.run_import(path, batch_size=2)
+        post = Post.objects.get(text='Про котов')
+        self.assertEqual(post.group, Group.objects.get(slug='cats'))
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertTrue(User.objects.filter(username='newcomer').exists())
+        self.assertFalse(Post.objects.filter(text='Без группы').exists())
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+        )
+        self.assertEqual(
+            list(FeedEntry.objects.filter(
+                user=self.reader
+            ).values_list('post_id', flat=True)),
+            [post.pk],
+        )
+        self.assertEqual(
+            [post_id for _, post_id in get_backend().search('кошки')],
+            [post.pk],
+        )
+        stats = ProfileStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(
+            ProfileStats.objects.get(user__username='newcomer').posts_count, 1
+        )
+
+    def test_import_csv(self):
+        path = os.path.join(self.directory, 'posts.csv')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('type,author,text\n')
+            file.write('post,author,"Первый, с запятой"\n')
+            file.write('post,author,"Второй\nв две строки"\n')
+        self.run_import(path)
+        self.assertEqual(
+            set(self.author.posts.values_list('text', flat=True)),
+            {'Первый, с запятой', 'Второй\nв две строки'},
+        )
+
+    def test_resume_after_failure(self):
+        """После сбоя повторный запуск не дублирует сохранённые пачки."""
+        path = self.write_jsonl('dump.jsonl', [
+            {'type': 'post', 'author': 'author', 'text': f'Пост {number}'}
+            for number in range(5)
+        ])
+        save_posts = ImportCommand.save_posts
+        calls = []
+
+        def failing(command, records):
+            calls.append(records)
+            if len(calls) == 2:
+                raise RuntimeError('сбой')
+            return save_posts(command, records)
+
+        with mock.patch.object(ImportCommand, 'save_posts', failing):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, batch_size=2)
+        self.assertEqual(self.author.posts.count(), 2)
+        self.run_import(path, batch_size=2)
+        self.assertEqual(
+            sorted(self.author.posts.values_list('text', flat=True)),
+            [f'Пост {number}' for number in range(5)],
+        )
+        self.write_jsonl('dump.jsonl', [
+            {'type': 'post', 'author': 'author', 'text': 'Дописанный'},
+        ])
+        self.run_import(path)
+        self.assertEqual(self.author.posts.count(), 6)
+
+
+class ExportPostsCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        for number in range(3):
+            Post.objects.create(text=f'Пост {number}', author=cls.author)
+
+    def test_export_round_trip(self):
+        """Выгрузка загружается обратно командой import_content."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'author.jsonl')
+        call_command(
+            'export_posts', author='author', output=path, stderr=StringIO()
+        )
+        Post.objects.all().delete()
+        call_command(
+            'import_content', path, stdout=StringIO(), stderr=StringIO()
+        )
+        self.assertEqual(
+            sorted(self.author.posts.values_list('text', flat=True)),
+            ['Пост 0', 'Пост 1', 'Пост 2'],
+        )
+
+
+class BenchmarkImagesCommandTest(TestCase):
+    def test_reports_baseline_and_variants(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'photo.png')
+        Image.new('RGB', (1600, 900), 'teal').save(path)
+        out = StringIO()
+        call_command('benchmark_images', path, repeat=1, stdout=out)
+        self.assertIn('100%', out.getvalue())
+        self.assertIn('1440', out.getvalue())
+
+
+class ShardImagesCommandTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=directory)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.author = User.objects.create_user(username='author')
+
+    def legacy_post(self, name, content=SMALL_GIF):
+        """Пост с картинкой, сохранённой до раскладки по подкаталогам."""
+        path = post_images.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+        post = Post.objects.create(text=name, author=self.author)
+        Post.objects.filter(pk=post.pk).update(image=name)
+        blob, _ = ImageBlob.objects.get_or_create(name=name)
+        ImageBlob.objects.filter(pk=blob.pk).update(
+            refcount=F('refcount') + 1
+        )
+        return post
+
+    def test_moves_files_and_rewrites_names(self):
+        other = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\x00\xFF')
+        other_digest = hashlib.sha256(other).hexdigest()
+        posts = [
+            self.legacy_post('posts/legacy.gif'),
+            self.legacy_post('posts/legacy.gif'),
+            self.legacy_post(f'posts/{other_digest}.gif', other),
+        ]
+        call_command(
+            'shard_images', batch_size=2, stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        expected = [
+            f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif',
+            f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif',
+            f'posts/{other_digest[:2]}/{other_digest[2:4]}/'
+            f'{other_digest}.gif',
+        ]
+        for post, name in zip(posts, expected):
+            post.refresh_from_db()
+            self.assertEqual(post.image.name, name)
+            self.assertTrue(post_images.exists(name))
+            self.assertTrue(post.image_renditions)
+        self.assertFalse(post_images.exists('posts/legacy.gif'))
+        self.assertFalse(post_images.exists(f'posts/{other_digest}.gif'))
+        self.assertEqual(
+            dict(ImageBlob.objects.values_list('name', 'refcount')),
+            {expected[0]: 2, expected[2]: 1},
+        )
+
+    def test_old_thumbnails_removed_and_pages_refreshed(self):
+        """Миниатюры старого файла удаляются, а ETag страниц группы
+        и профиля меняется."""
+        post = self.legacy_post('posts/legacy.gif')
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.filter(pk=post.pk).update(group=group)
+        thumbnails.generate_thumbnails(post.pk)
+        old_thumbnails = [
+            thumbnail.storage.path(thumbnail.name)
+            for thumbnail in thumbnails.thumbnail_files('posts/legacy.gif')
+        ]
+        self.assertTrue(old_thumbnails)
+        tags = ('group:group', f'author:{self.author.pk}')
+        before = get_generations(*tags)
+        call_command('shard_images', stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(any(map(os.path.exists, old_thumbnails)))
+        self.assertFalse(thumbnails.thumbnail_files('posts/legacy.gif'))
+        after = get_generations(*tags)
+        for tag in tags:
+            self.assertNotEqual(before[tag], after[tag])
+
+    def test_missing_file_is_reported(self):
+        post = Post.objects.create(text='Без файла', author=self.author)
+        Post.objects.filter(pk=post.pk).update(image='posts/lost.gif')
+        stderr = StringIO()
+        call_command('shard_images', stdout=StringIO(), stderr=stderr)
+        self.assertIn('posts/lost.gif', stderr.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, 'posts/lost.gif')
+
+
+class CleanMediaCommandTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=directory)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.author = User.objects.create_user(username='author')
+
+    def create_post(self, colour):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), colour).save(buffer, 'PNG')
+        post = Post.objects.create(
+            text=colour, author=self.author,
+            image=SimpleUploadedFile(f'{colour}.png', buffer.getvalue()),
+        )
+        thumbnails.generate_thumbnails(post.pk)
+        return post
+
+    def age_files(self):
+        day_ago = time.time() - 2 * 24 * 3600
+        for directory, _, files in os.walk(post_images.path('posts')):
+            for file in files:
+                os.utime(os.path.join(directory, file), (day_ago, day_ago))
+
+    def thumbnail_paths(self, name):
+        return [
+            thumbnail.storage.path(thumbnail.name)
+            for thumbnail in thumbnails.thumbnail_files(name)
+        ]
+
+    def test_removes_orphans_with_thumbnails(self):
+        kept = self.create_post('red')
+        edited = self.create_post('green')
+        replaced = edited.image.name
+        edited.image = self.create_post('blue').image
+        edited.save()
+        deleted = self.create_post('black')
+        removed = [replaced, deleted.image.name]
+        deleted.delete()
+        stale = post_images.path('posts/.upload-stale')
+        open(stale, 'wb').close()
+        self.age_files()
+        fresh = self.create_post('white')
+        fresh.delete()
+        removed_thumbnails = [
+            path for name in removed for path in self.thumbnail_paths(name)
+        ]
+        self.assertTrue(removed_thumbnails)
+
+        out = StringIO()
+        call_command('clean_media', dry_run=True, stdout=out)
+        self.assertIn('Можно удалить файлов: 3', out.getvalue())
+        self.assertTrue(all(map(os.path.exists, removed_thumbnails)))
+
+        call_command('clean_media', batch_size=2, stdout=StringIO())
+        for name in removed:
+            self.assertFalse(post_images.exists(name))
+        self.assertFalse(os.path.exists(stale))
+        self.assertFalse(any(map(os.path.exists, removed_thumbnails)))
+        self.assertTrue(post_images.exists(kept.image.name))
+        self.assertTrue(all(
+            map(os.path.exists, self.thumbnail_paths(kept.image.name))
+        ))
+        # Молодой файл мог ещё не получить свой пост.
+        self.assertTrue(post_images.exists(fresh.image.name))
+        self.assertFalse(
+            ImageBlob.objects.filter(name__in=removed).exists()
+        )
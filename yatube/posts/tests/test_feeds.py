@@ -0,0 +1,112 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .. import feeds
+from ..models import Follow, Post
+
+User = get_user_model()
+
+
+@override_settings(POSTS_FEED_ENGINE='pull')
+class PullFeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{index}')
+            for index in range(3)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+        for index in range(25):
+            Post.objects.create(
+                text=f'Пост {index}',
+                author=cls.authors[index % 3]
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, engine):
+        """Проходит ленту движком по курсорам до конца."""
+        pages = []
+        params = QueryDict()
+        while True:
+            page = feeds.FEED_ENGINES[engine](self.user, params)
+            pages.append(list(page))
+            if not page.next_cursor:
+                return pages
+            params = QueryDict(mutable=True)
+            params['after'] = page.next_cursor
+
+    def walk_back(self, engine, cursor):
+        """Проходит ленту движком назад от курсора до первой страницы."""
+        pages = []
+        while cursor:
+            params = QueryDict(mutable=True)
+            params['before'] = cursor
+            page = feeds.FEED_ENGINES[engine](self.user, params)
+            pages.append(list(page))
+            cursor = page.previous_cursor
+        return pages
+
+    def test_pull_matches_join(self):
+        """Слияние списков авторов даёт ту же ленту, что и join."""
+        self.assertEqual(self.walk('pull'), self.walk('join'))
+
+    def test_pull_falls_back_beyond_cached_lists(self):
+        """Страницы глубже усечённых списков строятся запросом с join."""
+        with mock.patch.object(feeds, 'RECENT_POSTS_LIMIT', 4):
+            self.assertEqual(self.walk('pull'), self.walk('join'))
+
+    def test_pull_pages_back_beyond_cached_lists(self):
+        """Назад от страницы за усечёнными списками лента не теряет
+        постов.
+        """
+        last = Post.objects.filter(
+            author__following__user=self.user
+        ).order_by('-pub_date', '-id')[20]
+        cursor = feeds.CursorPaginator(
+            Post.objects.all(), feeds.POST_IN_PAGE
+        ).encode_cursor(last)
+        with mock.patch.object(feeds, 'RECENT_POSTS_LIMIT', 4):
+            pages = self.walk_back('pull', cursor)
+        self.assertEqual(pages, self.walk_back('join', cursor))
+        self.assertEqual(sum(map(len, pages)), 20)
+
+    def test_new_post_invalidates_recent_list(self):
+        feeds.follow_page(self.user, QueryDict())
+        new_post = Post.objects.create(text='Свежий', author=self.authors[0])
+        page = feeds.follow_page(self.user, QueryDict())
+        self.assertEqual(page[0], new_post)
+
+    def test_recent_posts_read_in_one_query_per_chunk(self):
+        """На холодном кеше число запросов не растёт с числом авторов."""
+        silent = User.objects.create_user(username='silent')
+        author_ids = [author.pk for author in self.authors] + [silent.pk]
+        with mock.patch.object(feeds, 'RECENT_POSTS_LIMIT', 4):
+            with CaptureQueriesContext(connection) as queries:
+                lists = feeds.recent_posts(author_ids)
+            self.assertEqual(len(queries), 1)
+            self.assertEqual(lists[silent.pk], [])
+            for author in self.authors:
+                expected = list(Post.objects.filter(
+                    author=author
+                ).order_by('-pub_date', '-id').values_list(
+                    'pub_date', 'id'
+                )[:4])
+                self.assertEqual(lists[author.pk], expected)
+            cache.clear()
+            with mock.patch.object(feeds, 'LOOKUP_CHUNK', 2):
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(feeds.recent_posts(author_ids), lists)
+            self.assertEqual(len(queries), 2)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(feeds.recent_posts(author_ids), lists)
+            self.assertEqual(len(queries), 0)
@@ -1,10 +1,21 @@
+import io
+import json
+import os
 import shutil
+import struct
+from http import HTTPStatus
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import Client, TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
 
+from core.models import Task
+
+from .. import thumbnails
 from ..forms import PostForm
 from ..models import Post, Group
 from .test_views import SMALL_GIF, TEMP_MEDIA_ROOT, COMMENT_TEXT
@@ -121,3 +132,254 @@ class CommentFormTests(TestCase):
         self.assertEqual(new_comment.text, COMMENT_TEXT)
         self.assertEqual(new_comment.author, self.user)
         self.assertEqual(new_comment.post, self.post)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_post(self):
+        self.client.post(reverse('posts:create_post'), data={
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(
+                name='thumb.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        })
+        return Post.objects.get(text='Пост с картинкой')
+
+    @override_settings(TASKS_EAGER=True)
+    def test_thumbnails_ready_after_create(self):
+        """После создания поста шаблону не нужно открывать оригинал."""
+        post = self.create_post()
+        self.assertTrue(post.image)
+        with mock.patch.object(default.engine, 'get_image') as get_image:
+            for geometry, options in thumbnails.THUMBNAILS:
+                self.assertTrue(
+                    get_thumbnail(post.image, geometry, **options).url
+                )
+        get_image.assert_not_called()
+
+    @override_settings(TASKS_EAGER=False)
+    def test_thumbnails_queued_as_task(self):
+        """Миниатюры строит фоновая задача, а не запрос: создание поста
+        только ставит её в очередь и не пишет файлов вариантов."""
+        thumbnail_dir = os.path.join(TEMP_MEDIA_ROOT, 'cache')
+        before = media_files(thumbnail_dir)
+        with mock.patch.object(default.engine, 'get_image') as get_image:
+            post = self.create_post()
+        get_image.assert_not_called()
+        task = Task.objects.get()
+        self.assertEqual(
+            task.name, 'posts.thumbnails.generate_thumbnails'
+        )
+        self.assertEqual(json.loads(task.payload)['args'], [post.pk])
+        self.assertEqual(media_files(thumbnail_dir), before)
+        self.assertEqual(post.image_sources, [])
+
+    def test_built_thumbnails_refresh_profile(self):
+        """После сборки вариантов профиль автора отдаётся заново."""
+        post = self.create_post()
+        url = reverse(
+            'posts:profile', kwargs={'username': post.author.username}
+        )
+        etag = self.client.get(url)['ETag']
+        thumbnails.generate_thumbnails(post.pk)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, '<picture>')
+
+    @override_settings(
+        TASKS_EAGER=True, POSTS_IMAGE_FORMATS=('AVIF', 'JPEG')
+    )
+    def test_renditions_in_picture(self):
+        """Варианты строятся заранее и выводятся в <picture>;
+        неподдерживаемые форматы пропускаются."""
+        post = self.create_post()
+        self.assertEqual(
+            [mime for mime, _ in post.image_sources], ['image/jpeg']
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertContains(response, '<picture>')
+        self.assertContains(
+            response, f'srcset="{post.image_sources[0][1]}"'
+        )
+
+    @override_settings(TASKS_EAGER=True)
+    def test_new_image_resets_renditions(self):
+        post = self.create_post()
+        Post.objects.filter(pk=post.pk).update(image_renditions='[]')
+        # Другая палитра — другое содержимое, а значит и другой файл.
+        other_gif = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\x00\xFF')
+        self.client.post(
+            reverse('posts:edit', kwargs={'post_id': post.id}),
+            data={
+                'text': post.text,
+                'image': SimpleUploadedFile(
+                    name='other.gif', content=other_gif,
+                    content_type='image/gif'
+                ),
+            },
+        )
+        previous = post.image.name
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, previous)
+        self.assertIn('image/jpeg', post.image_renditions)
+
+
+def media_files(directory):
+    return {
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory) for name in names
+    }
+
+
+def image_upload(name, size, mode='RGB', image_format='JPEG', **options):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+def mpo_upload(name, size, exif):
+    """Двухкадровый MPO, как у стереоснимков с телефона."""
+    frames = []
+    for color in ('red', 'blue'):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'JPEG', exif=exif)
+        frames.append(buffer.getvalue())
+    first, second = frames
+    # APP2 MPF: TIFF-заголовок, IFD из трёх тегов и две записи MPEntry.
+    entries_offset = 8 + 2 + 3 * 12 + 4
+    segment_length = 2 + 4 + entries_offset + 2 * 16
+    first_size = len(first) + 2 + segment_length
+    tiff = b'II*\x00' + struct.pack(
+        '<LHHHL4sHHLLHHLLL', 8, 3,
+        0xB000, 7, 4, b'0100',
+        0xB001, 4, 1, 2,
+        0xB002, 7, 32, entries_offset, 0,
+    ) + struct.pack(
+        '<LLLHHLLLHH',
+        0x20030000, first_size, 0, 0, 0,
+        0x00020002, len(second), first_size - 10, 0, 0,
+    )
+    segment = b'\xff\xe2' + struct.pack('>H', segment_length) + b'MPF\x00'
+    return SimpleUploadedFile(
+        name, first[:2] + segment + tiff + first[2:] + second
+    )
+
+
+def animated_upload(name, size, image_format='GIF'):
+    frames = [Image.new('RGB', size, color) for color in ('red', 'blue')]
+    buffer = io.BytesIO()
+    frames[0].save(
+        buffer, image_format, save_all=True, append_images=frames[1:],
+        duration=200, loop=0, comment=b'secret',
+    )
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_IMAGE_MAX_SIDE=200,
+    TASKS_EAGER=True,
+)
+class ImageNormalizationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='normalizer')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_post(self, image):
+        self.client.post(reverse('posts:create_post'), data={
+            'text': 'Нормализация', 'image': image,
+        })
+        return Post.objects.get(text='Нормализация')
+
+    def test_photo_downscaled_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # повёрнут на 90°
+        exif[0x010F] = 'Camera maker'
+        post = self.create_post(
+            image_upload('photo.jpeg', (600, 300), exif=exif.tobytes())
+        )
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual((post.image_width, post.image_height), (100, 200))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (100, 200))
+            self.assertEqual(len(stored.getexif()), 0)
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,')
+        )
+
+    def test_transparency_kept_in_png(self):
+        post = self.create_post(
+            image_upload('logo.png', (50, 40), 'RGBA', 'PNG')
+        )
+        self.assertTrue(post.image.name.endswith('.png'))
+        self.assertEqual((post.image_width, post.image_height), (50, 40))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.mode, 'RGBA')
+
+    def test_mpo_stored_as_still_photo(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        upload = mpo_upload('stereo.jpg', (600, 300), exif.tobytes())
+        with Image.open(upload) as source:
+            self.assertEqual(source.format, 'MPO')
+            self.assertEqual(source.n_frames, 2)
+        post = self.create_post(upload)
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertEqual(stored.size, (200, 100))
+            self.assertEqual(len(stored.getexif()), 0)
+            self.assertEqual(stored.getpixel((0, 0))[0], 254)
+
+    def test_animation_downscaled_and_stripped(self):
+        post = self.create_post(animated_upload('anim.gif', (600, 300)))
+        self.assertTrue(post.image.name.endswith('.gif'))
+        self.assertEqual((post.image_width, post.image_height), (200, 100))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (200, 100))
+            self.assertEqual(stored.n_frames, 2)
+            self.assertEqual(stored.info['duration'], 200)
+            self.assertNotIn('comment', stored.info)
+
+    def test_dimensions_and_placeholder_in_markup(self):
+        post = self.create_post(image_upload('photo.jpg', (300, 300)))
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, post.image_placeholder)
+
+    def test_dimensions_filled_for_posts_saved_elsewhere(self):
+        post = Post.objects.create(
+            text='Из админки', author=self.user,
+            image=image_upload('admin.png', (30, 20), image_format='PNG'),
+        )
+        self.assertIsNone(post.image_width)
+        thumbnails.generate_thumbnails(post.pk)
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (30, 20))
+        self.assertTrue(post.image_placeholder)
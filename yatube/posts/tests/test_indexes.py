@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FEED_TABLES = ('posts_post', 'posts_comment', 'posts_follow',
+               'posts_feedentry')
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class FeedQueryPlanTest(TestCase):
+    """Запросы лент идут по индексам, без полного скана и сортировки."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description=''
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+        Comment.objects.create(text='Ответ', post=cls.post, author=cls.user)
+        cls.urls = [
+            reverse('posts:main_posts'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.author}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}),
+            reverse('posts:follow_index'),
+        ]
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def feed_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')
+            and any(table in query['sql'] for table in FEED_TABLES)
+        ]
+
+    def assertUsesIndexes(self, sql):
+        for step in query_plan(sql):
+            self.assertNotIn('TEMP B-TREE', step, sql)
+            # Подзапрос (оконная функция) сам читается по индексу.
+            if step.startswith('SCAN') and '(subquery-' not in step:
+                self.assertIn('USING', step, sql)
+
+    def test_feed_queries_use_indexes(self):
+        # Движок 'join' сливает посты разных авторов и сортирует их
+        # по определению, поэтому проверяются только fanout и pull.
+        for engine in ('fanout', 'pull'):
+            with override_settings(POSTS_FEED_ENGINE=engine):
+                for url in self.urls:
+                    for sql in self.feed_queries(url):
+                        with self.subTest(engine=engine, url=url, sql=sql):
+                            self.assertUsesIndexes(sql)
@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..search import encode_cursor, get_backend
+
+User = get_user_model()
+
+SEARCH = reverse('posts:search')
+
+
+class PostSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Котики', slug='cats', description=''
+        )
+        cls.cat_post = Post.objects.create(
+            text='Рыжий кот спит на диване', author=cls.user
+        )
+        cls.group_post = Post.objects.create(
+            text='Фото дня', author=cls.user, group=cls.group
+        )
+        cls.other_post = Post.objects.create(
+            text='Про собак', author=cls.user
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(SEARCH, {'q': query, **params})
+        return response.context['posts'], response.context['next_cursor']
+
+    def test_finds_by_text_prefix_and_group_title(self):
+        self.assertEqual(self.search('рыж')[0], [self.cat_post])
+        self.assertEqual(self.search('котики')[0], [self.group_post])
+        self.assertEqual(
+            set(self.search('кот')[0]), {self.cat_post, self.group_post}
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при правке поста, группы и удалении."""
+        self.other_post.text = 'Теперь про котлеты'
+        self.other_post.save()
+        self.assertIn(self.other_post, self.search('котлеты')[0])
+        self.group.title = 'Кошки'
+        self.group.save()
+        self.assertEqual(self.search('кошки')[0], [self.group_post])
+        self.cat_post.delete()
+        self.assertEqual(self.search('рыжий')[0], [])
+
+    def test_results_paginated_by_cursor(self):
+        for index in range(12):
+            Post.objects.create(text=f'Лиса номер {index}', author=self.user)
+        first_page, cursor = self.search('лиса')
+        second_page, last_cursor = self.search('лиса', after=cursor)
+        self.assertEqual(len(first_page), 10)
+        self.assertEqual(len(second_page), 2)
+        self.assertIsNone(last_cursor)
+        self.assertTrue(set(first_page).isdisjoint(second_page))
+
+    def test_out_of_range_cursor_is_ignored(self):
+        Post.objects.create(text='Лиса', author=self.user)
+        cursors = (encode_cursor(1.0, 2 ** 63), encode_cursor(1.0, 1e300))
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    SEARCH, {'q': 'лиса', 'after': cursor}
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_query_syntax_is_not_interpreted(self):
+        """Спецсимволы FTS5 в запросе не ломают поиск."""
+        response = self.client.get(SEARCH, {'q': 'кот" OR NEAR(*'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_search_uses_index(self):
+        matching = Post.objects.filter(
+            pk__in=get_backend().matching('диване')
+        )
+        self.assertEqual(list(matching), [self.cat_post])
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from ..models import ImageBlob, Post
+from ..storage import post_images
+from .test_views import SMALL_GIF
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def upload(name, content=SMALL_GIF):
+    return SimpleUploadedFile(
+        name=name, content=content, content_type='image/gif'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='storage')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def refcount(self, name):
+        return ImageBlob.objects.get(name=name).refcount
+
+    def test_name_is_content_hash(self):
+        name = post_images.save('posts/Small.GIF', upload('Small.GIF'))
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        self.assertEqual(
+            name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
+        )
+        self.assertTrue(
+            os.path.isfile(os.path.join(TEMP_MEDIA_ROOT, name))
+        )
+
+    def test_same_content_stored_once(self):
+        first = Post.objects.create(
+            text='Первый', author=self.user, image=upload('one.gif')
+        )
+        files = os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'posts'))
+        second = Post.objects.create(
+            text='Второй', author=self.user, image=upload('two.gif')
+        )
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'posts')), files
+        )
+        self.assertEqual(self.refcount(first.image.name), 2)
+
+    def test_refcount_follows_posts(self):
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=upload('one.gif')
+        )
+        old_name = post.image.name
+        post.text = 'Только текст'
+        post.save()
+        self.assertEqual(self.refcount(old_name), 1)
+        post.image = upload(
+            'two.gif', SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\x00\xFF')
+        )
+        post.save()
+        self.assertEqual(self.refcount(old_name), 0)
+        self.assertEqual(self.refcount(post.image.name), 1)
+        post.delete()
+        self.assertFalse(ImageBlob.objects.filter(refcount__gt=0).exists())
+        # Файлы без ссылок удаляет сборщик мусора, а не удаление поста.
+        self.assertTrue(post_images.exists(old_name))
@@ -1,5 +1,11 @@
+import csv
+import io
+import json
 import shutil
 import tempfile
+import zipfile
+from http import HTTPStatus
+from unittest import mock
 
 from django.core.cache import cache
 from django.contrib.auth import get_user_model
@@ -7,9 +13,17 @@ from django.test import TestCase, Client, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django import forms
 
-from ..models import Group, Post, Follow, Comment
+from core.cache import GENERATION_KEY
+
+from .. import exports, thumbnails
+from ..comments import COMMENTS_IN_PAGE, comments_count
+from ..models import (Group, Post, Follow, Comment, FeedEntry,
+                      ProfileStats)
+from ..paginators import POST_IN_PAGE, CursorPaginator
 
 User = get_user_model()
 
@@ -174,6 +188,160 @@ class PaginatorViewsTest(TestCase):
             self.assertEqual(len(response.context['page_obj']), 3)
 
 
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='VIP_NPS')
+        for index in range(13):
+            Post.objects.create(
+                text=f'запись номер {index}',
+                author=cls.user,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_next_and_previous_pages(self):
+        """Курсоры ведут на следующую и обратно на первую страницу."""
+        first_page = self.client.get(INDEX).context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertIsNone(first_page.previous_cursor)
+        second_page = self.client.get(
+            INDEX, {'after': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertIsNone(second_page.next_cursor)
+        self.assertTrue(set(first_page).isdisjoint(second_page))
+        back_page = self.client.get(
+            INDEX, {'before': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.client.get(INDEX, {'after': 'не курсор'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_out_of_range_cursor_returns_first_page(self):
+        """Числа за пределами BIGINT в курсоре не доходят до базы."""
+        post = Post.objects.first()
+        paginator = CursorPaginator(Post.objects.all(), POST_IN_PAGE)
+        self.client.force_login(self.user)
+        for values in ({'pub_date': post.pub_date, 'id': 2 ** 63},
+                       {'pub_date': post.pub_date, 'id': -2 ** 64}):
+            cursor = paginator.encode_cursor(values)
+            for url in (INDEX, FOLLOW_INDEX, reverse('api:index')):
+                with self.subTest(url=url, id=values['id']):
+                    response = self.client.get(url, {'after': cursor})
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_cursor_page_skips_count(self):
+        """Страница по курсору не выполняет COUNT(*)."""
+        cursor = self.client.get(INDEX).context['page_obj'].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(INDEX, {'after': cursor})
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries.captured_queries
+        ))
+
+
+class ProfileStatsViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        cls.PROFILE = reverse(
+            'posts:profile', kwargs={'username': cls.author})
+        cls.POST_DETAIL = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.id})
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании постов и подписок."""
+        Post.objects.create(text='Ещё пост', author=self.author)
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        stats = self.client.get(self.PROFILE).context['stats']
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.followers_count, 1)
+        follow.delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.followers_count, 0)
+
+    def test_pages_skip_count_queries(self):
+        """Профиль и пост не выполняют COUNT(*): счётчики заведены
+        вместе с пользователем."""
+        self.assertTrue(
+            ProfileStats.objects.filter(user=self.author).exists()
+        )
+        for url in (self.PROFILE, self.POST_DETAIL):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                self.assertFalse(any(
+                    'COUNT(' in query['sql']
+                    for query in queries.captured_queries
+                ))
+
+
+class QueryCountViewsTest(TestCase):
+    """Число запросов страницы не зависит от числа постов и комментариев."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.authors = [
+            User.objects.create_user(username=f'author{index}')
+            for index in range(3)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.authors[0], group=cls.group
+        )
+        cls.urls = [
+            INDEX,
+            FOLLOW_INDEX,
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.authors[0]}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}),
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def count_queries(self, url):
+        cache.clear()
+        self.client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        before = {url: self.count_queries(url) for url in self.urls}
+        for index in range(9):
+            Post.objects.create(
+                text=f'Пост {index}',
+                author=self.authors[index % 3],
+                group=self.group
+            )
+        for index in range(20):
+            Comment.objects.create(
+                text=f'Комментарий {index}',
+                post=self.post,
+                author=self.authors[index % 3]
+            )
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), before[url])
+
+
 class NewPostTests(TestCase):
     """Проверяем, что пост создается там, где нужно"""
     @classmethod
@@ -239,15 +407,11 @@ class CacheViewsTest(TestCase):
     def test_cache_index_pages(self):
         """Проверяем работу кэша главной страницы."""
         first_response = self.client.get(INDEX)
-        anoter_post_note = 'Еще один пост'
-        Post.objects.create(
-            text=anoter_post_note,
-            author=self.user
-        )
-        response_after_post_add = self.client.get(INDEX)
+        Post.objects.update(text='Изменено в обход сигналов')
+        response_from_cache = self.client.get(INDEX)
         self.assertEqual(
             first_response.content,
-            response_after_post_add.content
+            response_from_cache.content
         )
         cache.clear()
         response_after_cache_clean = self.client.get(INDEX)
@@ -256,6 +420,119 @@ class CacheViewsTest(TestCase):
             response_after_cache_clean.content
         )
 
+    def test_new_post_shown_at_once(self):
+        """Новый пост сразу виден на закэшированной главной."""
+        self.client.get(INDEX)
+        anoter_post_note = 'Еще один пост'
+        Post.objects.create(
+            text=anoter_post_note,
+            author=self.user
+        )
+        response_after_post_add = self.client.get(INDEX)
+        self.assertContains(response_after_post_add, anoter_post_note)
+
+    def test_pages_cached_separately(self):
+        """Каждая страница ленты кэшируется под своим ключом."""
+        for index in range(10):
+            Post.objects.create(text=f'Пост {index}', author=self.user)
+        cursor = self.client.get(INDEX).context['page_obj'].next_cursor
+        response = self.client.get(INDEX, {'after': cursor})
+        self.assertContains(response, 'Создаем пост')
+
+
+class ConditionalGetViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.user, group=cls.group
+        )
+        cls.urls = [
+            INDEX,
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_unchanged_page_not_modified(self):
+        """Неизменившаяся страница отвечает 304 без рендеринга."""
+        for client in (self.client, self.authorized_client):
+            for url in self.urls:
+                with self.subTest(url=url):
+                    etag = client.get(url)['ETag']
+                    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(
+                        response.status_code, HTTPStatus.NOT_MODIFIED
+                    )
+
+    def test_new_post_changes_etag(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        Post.objects.create(text='Новый', author=self.user, group=self.group)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_renames_change_etag(self):
+        """Новое название группы или имя автора меняют ETag страниц,
+        где они показаны."""
+        group = Group.objects.get(pk=self.group.pk)
+        author = User.objects.get(pk=self.user.pk)
+        changes = (
+            (group, 'title', self.urls),
+            (author, 'first_name', self.urls[1:]),
+        )
+        for obj, field, urls in changes:
+            etags = {url: self.client.get(url)['ETag'] for url in urls}
+            setattr(obj, field, 'Новое имя')
+            obj.save()
+            for url, etag in etags.items():
+                with self.subTest(field=field, url=url):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_password_change_keeps_etag(self):
+        """Сохранение пользователя без смены имени кэш не сбрасывает."""
+        author = User.objects.get(pk=self.user.pk)
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        author.set_password('новый пароль')
+        author.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+
+    def test_missing_objects_get_no_generation(self):
+        """Запросы несуществующих адресов не заводят ключи в кэше."""
+        urls = {
+            reverse('posts:group_list', kwargs={'slug': 'missing'}):
+                'group:missing',
+            reverse('posts:post_detail', kwargs={'post_id': 0}): 'post:0',
+            reverse('posts:comments', kwargs={'post_id': 0}): 'post:0',
+        }
+        for url, name in urls.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertIsNone(
+                    cache.get(GENERATION_KEY.format(name=name))
+                )
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -308,6 +585,35 @@ class FollowViewsTest(TestCase):
         response = self.authorized_client.get(FOLLOW_INDEX)
         self.assertNotIn(self.post, response.context['page_obj'])
 
+    def test_new_post_shown_to_follower(self):
+        """Новый пост автора сразу попадает в ленту подписчика."""
+        Follow.objects.create(user=self.user, author=self.another_user)
+        new_post = Post.objects.create(
+            text='Новый пост',
+            author=self.another_user
+        )
+        response = self.authorized_client.get(FOLLOW_INDEX)
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post]
+        )
+
+    def test_follow_page_not_shared_between_users(self):
+        """Закэшированная лента подписок одного не видна другому."""
+        Follow.objects.create(user=self.user, author=self.another_user)
+        self.authorized_client.get(FOLLOW_INDEX)
+        stranger = Client()
+        stranger.force_login(
+            User.objects.create_user(username='stranger')
+        )
+        response = stranger.get(FOLLOW_INDEX)
+        self.assertNotContains(response, self.post.text)
+
+    def test_unfollow_prunes_feed(self):
+        """После отписки посты автора пропадают из ленты."""
+        self.authorized_client.get(self.FOLLOW)
+        self.authorized_client.get(self.UNFOLLOW)
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+
     def test_user_cant_follow_youself(self):
         """Автор не может подписаться на себя"""
         self.authorized_client.get(
@@ -367,3 +673,213 @@ class CommentViewsTests(TestCase):
         comments_after = set(Comment.objects.filter(post=self.post))
         list_diff = comments_before ^ comments_after
         self.assertEqual(len(list_diff), 0)
+
+
+class CommentPaginationViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(COMMENTS_IN_PAGE + 5)
+        )
+        cls.COMMENTS = reverse(
+            'posts:comments', kwargs={'post_id': cls.post.id}
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_page(self):
+        """На странице поста только первая страница и общее число."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        self.assertEqual(len(response.context['comments']), COMMENTS_IN_PAGE)
+        self.assertEqual(
+            response.context['comments_count'], COMMENTS_IN_PAGE + 5
+        )
+        self.assertContains(response, 'js-more-comments')
+
+    def test_comments_json_pages(self):
+        """JSON отдаёт страницы комментариев по курсору до конца."""
+        first = self.client.get(self.COMMENTS, {'format': 'json'}).json()
+        self.assertEqual(len(first['comments']), COMMENTS_IN_PAGE)
+        second = self.client.get(
+            self.COMMENTS, {'format': 'json', 'after': first['next']}
+        ).json()
+        self.assertEqual(len(second['comments']), 5)
+        self.assertIsNone(second['next'])
+        ids = [item['id'] for item in first['comments'] + second['comments']]
+        self.assertEqual(
+            ids,
+            list(Comment.objects.order_by('-created', '-id').values_list(
+                'id', flat=True
+            )),
+        )
+
+    def test_comments_fragment(self):
+        """Без format=json отдаётся HTML-фрагмент без base.html."""
+        response = self.client.get(self.COMMENTS)
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+
+    def test_comments_unknown_post(self):
+        response = self.client.get(
+            reverse('posts:comments', kwargs={'post_id': self.post.id + 100})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_comments_count_follows_signals(self):
+        """Счётчик в кэше меняется вместе с комментариями без COUNT(*)."""
+        total = comments_count(self.post.id)
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='Ещё один'
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(comments_count(self.post.id), total + 1)
+        comment.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(comments_count(self.post.id), total)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='exporter')
+        cls.group = Group.objects.create(
+            title='Группа', slug='export_group', description='Описание'
+        )
+        cls.post_with_image = Post.objects.create(
+            text='С картинкой',
+            author=cls.user,
+            group=cls.group,
+            image=SimpleUploadedFile(
+                name='export.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        cls.post = Post.objects.create(text='Без картинки', author=cls.user)
+        Comment.objects.create(post=cls.post, author=cls.user, text='Отзыв')
+        cls.EXPORT = reverse(
+            'posts:profile_export', kwargs={'username': cls.user.username}
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def download(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_export_requires_login(self):
+        self.client.logout()
+        response = self.client.get(self.EXPORT)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_export_jsonl(self):
+        """JSONL — по строке на пост в порядке публикации."""
+        content = self.download(self.EXPORT, comments=1)
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [record['text'] for record in records],
+            ['С картинкой', 'Без картинки'],
+        )
+        self.assertEqual(records[0]['group'], self.group.slug)
+        self.assertEqual(records[1]['comments'][0]['text'], 'Отзыв')
+
+    def test_comments_read_in_chunks(self):
+        """Комментарии читаются пачками постов: IN (...) не упирается
+        в предел параметров SQLite."""
+        Comment.objects.create(
+            post=self.post_with_image, author=self.user, text='Первый'
+        )
+        with mock.patch.object(exports, 'LOOKUP_CHUNK', 1):
+            with CaptureQueriesContext(connection) as queries:
+                content = self.download(self.EXPORT, comments=1)
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [record['comments'][0]['text'] for record in records],
+            ['Первый', 'Отзыв'],
+        )
+        self.assertEqual(sum(
+            '"posts_comment"."text"' in query['sql']
+            for query in queries.captured_queries
+        ), 2)
+
+    def test_export_csv(self):
+        content = self.download(self.EXPORT, format='csv', comments=1)
+        rows = list(csv.DictReader(io.StringIO(content.decode())))
+        self.assertEqual(
+            [row['type'] for row in rows], ['post', 'post', 'comment']
+        )
+        self.assertEqual(rows[2]['post'], str(self.post.id))
+
+    def test_export_zip_contains_images(self):
+        content = self.download(self.EXPORT, format='zip')
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            image = f'images/{self.post_with_image.image.name}'
+            self.assertEqual(archive.read(image), SMALL_GIF)
+            records = [
+                json.loads(line)
+                for line in archive.read('posts.jsonl').splitlines()
+            ]
+        self.assertEqual(records[0]['image'], image)
+
+    def test_group_export(self):
+        content = self.download(
+            reverse('posts:group_export', kwargs={'slug': self.group.slug})
+        )
+        self.assertEqual(len(content.splitlines()), 1)
+
+    def test_unknown_format(self):
+        response = self.client.get(self.EXPORT, {'format': 'xml'})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPrefetchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='illustrator')
+        for number in range(POST_IN_PAGE):
+            post = Post.objects.create(
+                text=f'Пост {number}',
+                author=cls.user,
+                image=SimpleUploadedFile(
+                    name=f'pic{number}.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif',
+                ),
+            )
+            thumbnails.generate_thumbnails(post.pk)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_feed_reads_thumbnails_in_one_batch(self):
+        """Записи миниатюр страницы читаются одним запросом, а не
+        запросом на каждый пост."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(INDEX)
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertContains(
+            response, 'class="card-img h-auto my-2"', count=POST_IN_PAGE
+        )
@@ -0,0 +1,227 @@
+"""Миниатюры картинок постов, построенные заранее.
+
+Шаблоны выводят картинки тегом {% thumbnail %} с геометрией из
+THUMBNAILS. Если построить миниатюры сразу после сохранения поста,
+фоновой задачей (core.tasks), тег при рендеринге только находит
+готовую запись в хранилище sorl-thumbnail и не открывает оригинал.
+
+Там же строятся варианты для srcset (ширины и форматы из настроек
+POSTS_IMAGE_*); их адреса сохраняются в Post.image_renditions.
+Картинкам без размеров (загруженным в обход PostForm) заодно
+заполняются размеры и заглушка.
+
+PrefetchKVStore и prefetch_thumbnails читают записи sorl для всей
+страницы одним обращением к кэшу вместо обращения на каждый тег.
+"""
+import json
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from PIL import Image
+from sorl.thumbnail import default, delete, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.conf import defaults as thumbnail_defaults
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (EMPTY_VALUE,
+                                                       KVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import tasks
+from core.cache import bump_generations, post_tags
+
+from . import images
+from .models import Post
+
+# Должны совпадать с {% thumbnail %} в posts/includes/image.html.
+THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+# Пропорции кадра в ленте: варианты режутся так же, как миниатюра.
+FRAME_WIDTH, FRAME_HEIGHT = 960, 339
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+}
+
+
+def rendition_formats():
+    """Форматы из POSTS_IMAGE_FORMATS, доступные Pillow и sorl-thumbnail."""
+    Image.init()
+    return [
+        image_format for image_format in settings.POSTS_IMAGE_FORMATS
+        if image_format in Image.SAVE and image_format in EXTENSIONS
+    ]
+
+
+def build_renditions(image):
+    """Строит варианты картинки; [(mime-тип, srcset), ...]."""
+    sources = []
+    for image_format in rendition_formats():
+        urls = {}
+        for width in settings.POSTS_IMAGE_WIDTHS:
+            height = round(width * FRAME_HEIGHT / FRAME_WIDTH)
+            variant = get_thumbnail(
+                image, f'{width}x{height}',
+                crop='center', upscale=False, format=image_format,
+                quality=settings.POSTS_IMAGE_QUALITY,
+            )
+            # Маленький оригинал даёт одинаковые варианты разных ширин.
+            urls.setdefault(variant.width, variant.url)
+        srcset = ', '.join(f'{url} {width}w' for width, url in urls.items())
+        sources.append((MIME_TYPES[image_format], srcset))
+    return sources
+
+
+@tasks.task()
+def generate_thumbnails(post_id):
+    post = Post.objects.filter(pk=post_id).select_related('group').only(
+        'image', 'image_width', 'author_id', 'group__slug'
+    ).first()
+    if post is None or not post.image:
+        return
+    for geometry, options in THUMBNAILS:
+        get_thumbnail(post.image, geometry, **options)
+    fields = {
+        'image_renditions': json.dumps(build_renditions(post.image)),
+    }
+    if post.image_width is None:
+        # Картинка загружена не через PostForm (админка, старые посты):
+        # размеры и заглушку дополняем здесь, раз файл всё равно открыт.
+        with post.image.open('rb') as file:
+            info = images.describe(file)
+        fields.update(
+            image_width=info.width,
+            image_height=info.height,
+            image_placeholder=info.placeholder,
+        )
+    # update() не шлёт post_save: не нужна ни переиндексация, ни лента,
+    # только сброс закэшированных страниц с этим постом, в том числе
+    # профиля автора и группы.
+    Post.objects.filter(pk=post_id, image=post.image.name).update(**fields)
+    bump_generations('feed:index', *post_tags([post]))
+
+
+def schedule_thumbnails(post):
+    """Ставит построение миниатюр поста в очередь фоновых задач."""
+    if post.image:
+        generate_thumbnails.enqueue(post.pk)
+
+
+class PrefetchKVStore(KVStore):
+    """Хранилище sorl-thumbnail с чтением ключей страницы пачкой.
+
+    Ключи, объявленные через expect(), читаются все сразу — одним
+    get_many из кэша и одним запросом за недостающими — при первом
+    обращении к любому из них. Если шаблон взят из кэша фрагментов
+    и ни одного тега {% thumbnail %} не выполнил, чтения нет вовсе.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._local = threading.local()
+
+    @property
+    def _prefetch(self):
+        if not hasattr(self._local, 'expected'):
+            self._local.expected = set()
+            self._local.values = {}
+        return self._local
+
+    def expect(self, keys):
+        self._prefetch.expected.update(keys)
+
+    def forget(self):
+        self._prefetch.expected = set()
+        self._prefetch.values = {}
+
+    def _load_expected(self):
+        prefetch = self._prefetch
+        keys = list(prefetch.expected)
+        prefetch.expected = set()
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            fresh = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(
+                fresh, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            values.update(fresh)
+        prefetch.values.update(values)
+
+    def _get_raw(self, key):
+        prefetch = self._prefetch
+        if key in prefetch.expected:
+            self._load_expected()
+        if key in prefetch.values:
+            value = prefetch.values[key]
+            return None if value == EMPTY_VALUE else value
+        return super()._get_raw(key)
+
+    def _set_raw(self, key, value):
+        self._prefetch.values.pop(key, None)
+        super()._set_raw(key, value)
+
+    def _delete_raw(self, *keys):
+        for key in keys:
+            self._prefetch.values.pop(key, None)
+        super()._delete_raw(*keys)
+
+
+def thumbnail_key(image, geometry, options):
+    """Ключ записи миниатюры в хранилище sorl.
+
+    Повторяет ThumbnailBackend.get_thumbnail до обращения к хранилищу.
+    """
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for name, value in backend.default_options.items():
+        options.setdefault(name, value)
+    for name, setting in backend.extra_options:
+        value = getattr(thumbnail_settings, setting)
+        if value != getattr(thumbnail_defaults, setting):
+            options.setdefault(name, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return add_prefix(ImageFile(name, default.storage).key)
+
+
+def thumbnail_files(name):
+    """Миниатюры, которые sorl построил из картинки поста с этим именем."""
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    keys = default.kvstore._get(source.key, identity='thumbnails') or []
+    files = (default.kvstore._get(key) for key in keys)
+    return [file for file in files if file]
+
+
+def delete_with_thumbnails(name):
+    """Удаляет картинку, её миниатюры и записи о них в хранилище sorl."""
+    delete(ImageFile(name, Post._meta.get_field('image').storage))
+
+
+@contextmanager
+def prefetch_thumbnails(posts):
+    """Миниатюры этих постов в шаблоне читаются одной пачкой."""
+    kvstore = default.kvstore
+    if not hasattr(kvstore, 'expect'):
+        yield
+        return
+    kvstore.expect(
+        thumbnail_key(post.image, geometry, options)
+        for post in posts if post.image
+        for geometry, options in THUMBNAILS
+    )
+    try:
+        yield
+    finally:
+        kvstore.forget()
@@ -8,12 +8,28 @@ app_name = 'posts'
 urlpatterns = [
     path('', views.index, name='main_posts'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path(
+        'group/<slug:slug>/export/',
+        views.group_export,
+        name='group_export'
+    ),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path(
+        'profile/<str:username>/export/',
+        views.profile_export,
+        name='profile_export'
+    ),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.create_post, name='create_post'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='edit'),
     path('posts/<int:post_id>/comment/', views.add_comment, name=(
         'add_comment')),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='comments'
+    ),
+    path('search/', views.post_search, name='search'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
@@ -4,49 +4,93 @@ from django.shortcuts import (render,
                               )
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import condition
 
+from core.cache import (generation_etag, generation_tag, post_tags,
+                        tag_response)
+
+from . import comments, exports, feeds, search, thumbnails
 from .forms import PostForm, CommentForm
-from .models import Post, Group, Follow
+from .models import Post, Group, Follow, ProfileStats
+from .paginators import POST_IN_PAGE, paginate
 
 User = get_user_model()
-POST_IN_PAGE = 10
 
 
+def index_etag(request):
+    return generation_etag(request, 'feed:index')
+
+
+def group_etag(request, slug):
+    # Поколение заводится только для существующих объектов, иначе
+    # каждый запрос несуществующего адреса оставлял бы ключ в кэше.
+    if Group.objects.filter(slug=slug).exists():
+        return generation_etag(request, f'group:{slug}')
+
+
+def profile_etag(request, username):
+    user_id = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    if user_id is not None:
+        return generation_etag(request, f'author:{user_id}')
+
+
+def post_etag(request, post_id):
+    author_id = Post.objects.filter(
+        pk=post_id
+    ).values_list('author_id', flat=True).first()
+    if author_id is not None:
+        return generation_etag(
+            request, f'post:{post_id}', f'author:{author_id}'
+        )
+
+
+def comments_etag(request, post_id):
+    if Post.objects.filter(pk=post_id).exists():
+        return generation_etag(request, f'post:{post_id}')
+
+
+@condition(etag_func=index_etag)
 def index(request):
-    posts = Post.objects.all().order_by('-pub_date')
-    paginator = Paginator(posts, POST_IN_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.select_related('author', 'group')
+    page_obj = paginate(request.GET, posts)
     template = 'posts/index.html'
     context = {
         'page_obj': page_obj,
+        'feed_version': generation_tag('feed:index'),
     }
-    return render(request, template, context)
+    with thumbnails.prefetch_thumbnails(page_obj):
+        response = render(request, template, context)
+    return tag_response(response, 'feed:index', *post_tags(page_obj))
 
 
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, POST_IN_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.select_related('author', 'group')
+    page_obj = paginate(request.GET, posts)
     context = {
         'group': group,
         'posts': posts,
         'page_obj': page_obj,
         'group_page': True,
     }
-    return render(request, 'posts/group_list.html', context)
+    with thumbnails.prefetch_thumbnails(page_obj):
+        response = render(request, 'posts/group_list.html', context)
+    return tag_response(
+        response, f'group:{group.slug}', *post_tags(page_obj)
+    )
 
 
+@condition(etag_func=profile_etag)
 def profile(request, username):
     user = get_object_or_404(User, username=username)
     posts = user.posts.select_related('group', 'author')
-    post_count = posts.count()
-    paginator = Paginator(posts, POST_IN_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    stats = ProfileStats.for_user(user)
+    page_obj = paginate(request.GET, posts)
     is_following = (request.user != user
                     and request.user.is_authenticated
                     and Follow.objects.filter(
@@ -56,31 +100,76 @@ def profile(request, username):
     context = {
         'author': user,
         'posts': posts,
-        'post_number': post_count,
+        'stats': stats,
+        'post_number': stats.posts_count,
         'page_obj': page_obj,
         'profile_page': True,
         'is_following': is_following
     }
-    return render(request, 'posts/profile.html', context)
+    with thumbnails.prefetch_thumbnails(page_obj):
+        response = render(request, 'posts/profile.html', context)
+    return tag_response(response, f'author:{user.id}', *post_tags(page_obj))
 
 
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    post_count = post.author.posts.count()
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
+    post_count = ProfileStats.for_user(post.author).posts_count
+    # Первая страница комментариев читается, только если фрагмент
+    # шаблона не нашёлся в кэше.
+    comments_page = SimpleLazyObject(lambda: comments.comments_page(post.id))
     form = CommentForm()
     context = {
         'post_number': post_count,
         'post': post,
         'form': form,
-        'comments': comments,
+        'comments': comments_page,
+        'comments_count': comments.comments_count(post.id),
+        'comments_version': generation_tag(f'post:{post.id}'),
+    }
+    return tag_response(
+        render(request, 'posts/post_detail.html', context),
+        *post_tags([post])
+    )
+
+
+@condition(etag_func=comments_etag)
+def post_comments(request, post_id):
+    """Следующая страница комментариев: HTML-фрагмент или JSON."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    page = comments.comments_page(post.pk, after=request.GET.get('after'))
+    if request.GET.get('format') == 'json':
+        response = JsonResponse({
+            'comments': [comments.comment_as_dict(item) for item in page],
+            'next': page.next_cursor,
+        })
+    else:
+        response = render(request, 'posts/includes/comments.html', {
+            'post': post,
+            'comments': page,
+        })
+    return tag_response(response, f'post:{post.pk}')
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = search.search_page(
+        query, after=request.GET.get('after'), per_page=POST_IN_PAGE
+    )
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
     }
-    return render(request, 'posts/post_detail.html', context)
+    with thumbnails.prefetch_thumbnails(posts):
+        return render(request, 'posts/search.html', context)
 
 
 @login_required
 def create_post(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     context = {
         'form': form
     }
@@ -89,6 +178,7 @@ def create_post(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    thumbnails.schedule_thumbnails(post)
     return redirect('posts:profile', post.author)
 
 
@@ -107,7 +197,13 @@ def post_edit(request, post_id):
     if request.user != post.author:
         return redirect('posts:post_detail', post_id)
     if form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        if 'image' in form.changed_data:
+            # Старые варианты показывали бы прежнюю картинку.
+            post.image_renditions = ''
+        post.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule_thumbnails(post)
         return redirect('posts:post_detail', post_id)
     return render(request, 'posts/create_post.html', context)
 
@@ -126,13 +222,16 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    post = Post.objects.filter(author__following__user=request.user)
+    page_obj = feeds.follow_page(request.user, request.GET)
     template = 'posts/follow.html'
-    paginator = Paginator(post, POST_IN_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    context = {'page_obj': page_obj}
-    return render(request, template, context)
+    context = {
+        'page_obj': page_obj,
+        'feed_version': generation_tag(
+            'feed:index', f'feed:follow:{request.user.id}'
+        ),
+    }
+    with thumbnails.prefetch_thumbnails(page_obj):
+        return render(request, template, context)
 
 
 @login_required
@@ -154,3 +253,33 @@ def profile_unfollow(request, username):
         author__username=username
     ).delete()
     return redirect('posts:profile', username=username)
+
+
+def export_response(request, posts, name):
+    """Скачивание постов: ?format=jsonl|csv|zip, ?comments=1."""
+    file_format = request.GET.get('format', 'jsonl')
+    if file_format not in exports.EXPORT_FORMATS:
+        raise Http404('Неизвестный формат выгрузки')
+    response = StreamingHttpResponse(
+        exports.stream_export(
+            posts, file_format,
+            with_comments=bool(request.GET.get('comments')),
+        ),
+        content_type=exports.EXPORT_FORMATS[file_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}-posts.{file_format}"'
+    )
+    return response
+
+
+@login_required
+def profile_export(request, username):
+    user = get_object_or_404(User, username=username)
+    return export_response(request, user.posts.all(), user.username)
+
+
+@login_required
+def group_export(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return export_response(request, group.posts.all(), group.slug)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -46,18 +47,21 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -136,16 +140,73 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:main_posts'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма ставятся в очередь в базе (core.mail), отправляет их
+# manage.py send_emails через OUTBOX_EMAIL_BACKEND: пачками по
+# EMAIL_OUTBOX_BATCH, не быстрее EMAIL_OUTBOX_RATE писем в секунду.
+EMAIL_BACKEND = 'core.mail.OutboxEmailBackend'
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+EMAIL_OUTBOX_BATCH = 50
+EMAIL_OUTBOX_RATE = 10
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кэш в файле SQLite общий для всех процессов-воркеров, поэтому сброс
+# тегов и поколений из одного процесса виден остальным.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
+# Тесты (manage.py test и pytest) не трогают кэш разработки в файле.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
+PAGE_CACHE_TIMEOUT = 60 * 15
 
 CSRF_FAILURE_VIEW = 'core.views.permission_denied'
+
+# Движок ленты подписок: 'fanout' (материализованная лента),
+# 'pull' (слияние кэшированных списков авторов) или 'join'.
+# При переключении на 'fanout' ленты нужно пересобрать: rebuild_feeds.
+POSTS_FEED_ENGINE = 'fanout'
+
+# Полнотекстовый поиск по постам. По умолчанию бэкенд выбирается по СУБД:
+# индекс FTS5 в SQLite, для остальных — icontains без индекса.
+# POSTS_SEARCH_BACKEND = 'posts.search.FallbackSearchBackend'
+
+# Фоновые задачи (core.tasks) выполняет manage.py run_tasks в пуле
+# из TASKS_WORKERS потоков. TASKS_EAGER=1 в окружении выполняет задачи
+# сразу при постановке, прямо в запросе, без воркера.
+TASKS_WORKERS = 4
+TASKS_EAGER = os.environ.get('TASKS_EAGER', '').lower() in ('1', 'true')
+if TESTING:
+    # Тесты самой очереди выключают это через override_settings.
+    TASKS_EAGER = True
+
+# Загруженные картинки уменьшаются до этого размера по большей стороне
+# и перекодируются без метаданных (см. posts.images).
+POSTS_IMAGE_MAX_SIDE = 2560
+POSTS_IMAGE_ORIGINAL_QUALITY = 88
+
+# Варианты картинки поста для srcset: ширины в пикселях и форматы
+# в порядке предпочтения. Форматы, которые не умеют кодировать
+# Pillow или sorl-thumbnail, пропускаются.
+POSTS_IMAGE_WIDTHS = (480, 960, 1440)
+POSTS_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POSTS_IMAGE_QUALITY = 80
+
+# Хранилище sorl-thumbnail, читающее записи миниатюр страницы пачкой.
+THUMBNAIL_KVSTORE = 'posts.thumbnails.PrefetchKVStore'
@@ -9,6 +9,7 @@ urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/', include('api.urls', namespace='api')),
 ]
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'